@@ -0,0 +1,66 @@
+"""Add movie full-text search
+
+Revision ID: b1e4c7a9d2f3
+Revises: 479807857229
+Create Date: 2026-10-18 09:12:44.281305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b1e4c7a9d2f3'
+down_revision: Union[str, None] = '479807857229'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+SQLITE_UPGRADE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS movies_fts USING fts5("
+    "title, description, content='movies', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS movies_fts_ai AFTER INSERT ON movies BEGIN "
+    "INSERT INTO movies_fts(rowid, title, description) VALUES (new.id, new.title, new.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS movies_fts_ad AFTER DELETE ON movies BEGIN "
+    "INSERT INTO movies_fts(movies_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS movies_fts_au AFTER UPDATE OF title, description ON movies BEGIN "
+    "INSERT INTO movies_fts(movies_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO movies_fts(rowid, title, description) VALUES (new.id, new.title, new.description); "
+    "END",
+    # Index the rows that existed before the triggers did.
+    "INSERT INTO movies_fts(movies_fts) VALUES ('rebuild')",
+]
+
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS movies_fts_au",
+    "DROP TRIGGER IF EXISTS movies_fts_ad",
+    "DROP TRIGGER IF EXISTS movies_fts_ai",
+    "DROP TABLE IF EXISTS movies_fts",
+]
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_UPGRADE:
+            op.execute(statement)
+    elif dialect == 'postgresql':
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_movies_search ON movies "
+            "USING GIN (to_tsvector('english'::regconfig, title || ' ' || description))"
+        )
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_DOWNGRADE:
+            op.execute(statement)
+    elif dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_movies_search")
@@ -0,0 +1,58 @@
+"""Add movie rating aggregates
+
+Revision ID: c5d2e8f1a7b4
+Revises: b1e4c7a9d2f3
+Create Date: 2026-10-18 10:03:17.905122
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d2e8f1a7b4'
+down_revision: Union[str, None] = 'b1e4c7a9d2f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_CHUNK_SIZE = 1000
+
+
+def upgrade() -> None:
+    op.add_column('movies', sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('movies', sa.Column('rating_sum', sa.Float(), server_default='0', nullable=False))
+    op.add_column('movies', sa.Column('rating_avg', sa.Float(), nullable=True))
+
+    # Backfill in primary-key chunks, each committed on its own (autocommit_block ends the
+    # migration transaction first), so a large catalog never holds one giant write lock.
+    # The UPDATE is idempotent, so an interrupted backfill is safe to finish by hand.
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        last_id = 0
+        while True:
+            ids = conn.execute(
+                sa.text("SELECT id FROM movies WHERE id > :last_id ORDER BY id LIMIT :chunk"),
+                {"last_id": last_id, "chunk": BACKFILL_CHUNK_SIZE},
+            ).scalars().all()
+            if not ids:
+                break
+            conn.execute(
+                sa.text(
+                    "UPDATE movies SET "
+                    "rating_count = (SELECT COUNT(*) FROM ratings WHERE ratings.movie_id = movies.id), "
+                    "rating_sum = (SELECT COALESCE(SUM(score), 0) FROM ratings WHERE ratings.movie_id = movies.id), "
+                    "rating_avg = (SELECT AVG(score) FROM ratings WHERE ratings.movie_id = movies.id) "
+                    "WHERE id BETWEEN :first_id AND :last_id"
+                ),
+                {"first_id": ids[0], "last_id": ids[-1]},
+            )
+            last_id = ids[-1]
+
+
+def downgrade() -> None:
+    # Plain DROP COLUMN (SQLite 3.35+); a batch table rebuild would also drop the FTS triggers.
+    op.drop_column('movies', 'rating_avg')
+    op.drop_column('movies', 'rating_sum')
+    op.drop_column('movies', 'rating_count')
@@ -0,0 +1,28 @@
+"""Add comment keyset indexes
+
+Revision ID: d8b6f3a2c9e1
+Revises: c5d2e8f1a7b4
+Create Date: 2026-10-18 11:41:09.517264
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8b6f3a2c9e1'
+down_revision: Union[str, None] = 'c5d2e8f1a7b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_comments_movie_id_parent_comment_id_id', 'comments', ['movie_id', 'parent_comment_id', 'id'], unique=False)
+    op.create_index('ix_comments_parent_comment_id_id', 'comments', ['parent_comment_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_comments_parent_comment_id_id', table_name='comments')
+    op.drop_index('ix_comments_movie_id_parent_comment_id_id', table_name='comments')
@@ -0,0 +1,35 @@
+"""Hot path index pack
+
+Revision ID: e2c9a4b7f5d8
+Revises: d8b6f3a2c9e1
+Create Date: 2026-10-18 12:26:52.640118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2c9a4b7f5d8'
+down_revision: Union[str, None] = 'd8b6f3a2c9e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # comments.movie_id and comments.parent_comment_id are already the leading columns
+    # of the keyset indexes from d8b6f3a2c9e1, so only ratings needs new indexes.
+    op.create_index(op.f('ix_ratings_movie_id'), 'ratings', ['movie_id'], unique=False)
+    op.create_index(op.f('ix_ratings_user_id'), 'ratings', ['user_id'], unique=False)
+    # Free-text columns are never filtered by equality; these only slowed down writes.
+    op.drop_index(op.f('ix_movies_description'), table_name='movies')
+    op.drop_index(op.f('ix_comments_content'), table_name='comments')
+
+
+def downgrade() -> None:
+    op.create_index(op.f('ix_comments_content'), 'comments', ['content'], unique=False)
+    op.create_index(op.f('ix_movies_description'), 'movies', ['description'], unique=False)
+    op.drop_index(op.f('ix_ratings_user_id'), table_name='ratings')
+    op.drop_index(op.f('ix_ratings_movie_id'), table_name='ratings')
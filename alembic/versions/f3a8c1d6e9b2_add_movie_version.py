@@ -0,0 +1,27 @@
+"""Add movie version
+
+Revision ID: f3a8c1d6e9b2
+Revises: e2c9a4b7f5d8
+Create Date: 2026-10-18 14:41:08.372915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a8c1d6e9b2'
+down_revision: Union[str, None] = 'e2c9a4b7f5d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('movies', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    # Plain DROP COLUMN (SQLite 3.35+); a batch table rebuild would also drop the FTS triggers.
+    op.drop_column('movies', 'version')
@@ -0,0 +1,23 @@
+# app/async_crud.py
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import crud, fieldsets
+
+# Async counterparts of the hot read functions in app.crud. Each one runs the sync
+# implementation through AsyncSession.run_sync, so loader options, reply wiring and
+# pagination rules stay in one place while the I/O itself is awaited on the event loop.
+
+async def get_movie(db: AsyncSession, movie_id: int, fieldset: Optional[fieldsets.MovieFieldset] = None):
+    return await db.run_sync(crud.get_movie, movie_id, fieldset)
+
+async def get_movie_version(db: AsyncSession, movie_id: int):
+    return await db.run_sync(crud.get_movie_version, movie_id)
+
+async def get_movies(db: AsyncSession, movie_id: Optional[int] = None, after: Optional[int] = None, limit: int = 20, fieldset: Optional[fieldsets.MovieFieldset] = None):
+    return await db.run_sync(crud.get_movies, movie_id, after, limit, fieldset)
+
+async def get_comments(db: AsyncSession, movie_id: int, skip: int = 0, limit: int = 10, after: Optional[int] = None):
+    return await db.run_sync(crud.get_comments, movie_id, skip, limit, after)
+
+async def get_ratings(db: AsyncSession, movie_id: int):
+    return await db.run_sync(crud.get_ratings, movie_id)
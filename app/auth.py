@@ -4,13 +4,14 @@ import datetime
 from datetime import timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
 from dotenv import load_dotenv
 import app.crud as crud
-from app import schema
+from app import hashing, metrics, models, schema
+from app.cache import TTLCache
 from app.database import SessionLocal, get_db
 
 load_dotenv()
@@ -19,20 +20,53 @@ SECRET_KEY = os.environ.get('SECRET_KEY')  # Change this in production
 ALGORITHM = os.environ.get('ALGORITHM')
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get('ACCESS_TOKEN_EXPIRE_MINUTES'))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = hashing.pwd_context
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+# Identities of recently authenticated users, keyed by the token's `sub`. The JWT is
+# verified on every request; this only skips the user lookup that follows it.
+AUTH_CACHE_TTL = float(os.environ.get('AUTH_CACHE_TTL', 60))
+AUTH_CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', 1024))
+user_cache = TTLCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+metrics.register("auth_user_cache", user_cache.stats)
+
+# session.info key for usernames whose cached identity goes stale when the session commits.
+_PENDING = "auth_cache_usernames"
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _collect_changed_user(mapper, connection, target):
+    # Evicting here, at flush, would let a request between flush and commit re-cache the old row.
+    history = inspect(target).attrs.username.history
+    object_session(target).info.setdefault(_PENDING, set()).update({target.username, *history.deleted})
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_cached_users(session):
+    for username in session.info.pop(_PENDING, ()):
+        user_cache.pop(username)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session):
+    session.info.pop(_PENDING, None)
+
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    verified, _ = hashing.verify_password(plain_password, hashed_password)
+    return verified
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return hashing.hash_password(password)
 
 
 def authenticate_user(db: Session, username: str, password: str):
     user = crud.get_user_by_username(db, username)
-    if not user or not verify_password(password, user.hashed_password):
+    if not user:
+        return False
+    verified, new_hash = hashing.verify_password(password, user.hashed_password)
+    if not verified:
         return False
+    if new_hash:
+        # Stored with an old bcrypt cost; upgrade it now that we have the plaintext.
+        user = crud.update_user_password(db, user, new_hash)
     return user
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -63,6 +97,9 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    identity = user_cache.get(token_data.username)
+    if identity is not None:
+        return identity
     user = crud.get_user_by_username(db, username=token_data.username)
     if user is None:
         raise HTTPException(
@@ -70,4 +107,6 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    return user
\ No newline at end of file
+    identity = schema.UserIdentity.model_validate(user)
+    user_cache.set(token_data.username, identity)
+    return identity
\ No newline at end of file
@@ -0,0 +1,260 @@
+import os
+import queue
+import socket
+import threading
+from abc import ABC, abstractmethod
+from typing import List, Optional
+from urllib.parse import unquote, urlparse
+
+from app.cache import ByteLRUCache
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+# memory:// keeps a per-process LRU; redis://[:password@]host[:port][/db] shares one between workers.
+CACHE_URL = os.getenv("CACHE_URL", "memory://")
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", 32 * 1024 * 1024))
+# Prepended to every key so several apps (or test runs) can share one Redis.
+CACHE_PREFIX = os.getenv("CACHE_PREFIX", "movies:")
+# A slow cache must not be slower than the database it fronts.
+CACHE_TIMEOUT = float(os.getenv("CACHE_TIMEOUT", 0.25))
+
+
+class CacheBackend(ABC):
+    """Byte-string key/value store behind the read caches.
+
+    Implementations fail open: if the store is unreachable, reads miss and writes are dropped.
+    """
+
+    # False if calls do network I/O and should be kept off the event loop.
+    local = True
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        """Store only if `key` is absent; return whether this call stored it."""
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    def clear(self):
+        """Drop every key this backend owns."""
+
+    @abstractmethod
+    def stats(self) -> dict:
+        ...
+
+
+class LocalCacheBackend(CacheBackend):
+    """Per-process LRU, bounded by total value size."""
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self._lru = ByteLRUCache(max_bytes)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._lru.get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        self._lru.set(key, value, ttl)
+
+    def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        return self._lru.add(key, value, ttl)
+
+    def delete(self, key: str):
+        self._lru.delete(key)
+
+    def clear(self):
+        self._lru.clear()
+
+    def stats(self) -> dict:
+        return {"backend": "memory", **self._lru.stats()}
+
+
+class RedisError(Exception):
+    """An error reply from the server; the connection that got it is still usable."""
+
+
+class RedisConnection:
+    """One socket speaking RESP2: commands go out as arrays of bulk strings."""
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+
+    def execute(self, *args):
+        self.sock.sendall(encode_command(*args))
+        return self.read_reply()
+
+    def read_reply(self):
+        line = self.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection closed by the cache server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload
+        if kind == b"-":
+            raise RedisError(payload.decode(errors="replace"))
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError("Connection closed by the cache server")
+            return data[:-2]
+        if kind == b"*":
+            length = int(payload)
+            return None if length < 0 else [self.read_reply() for _ in range(length)]
+        # Out of step with the server: nothing more can be read reliably from this socket.
+        raise ConnectionError(f"Unexpected reply: {line!r}")
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+def encode_command(*args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode()
+        elif isinstance(arg, (int, float)):
+            arg = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+class RedisCacheBackend(CacheBackend):
+    """Minimal Redis client covering only what the caches need, with a small connection pool."""
+
+    local = False
+
+    def __init__(self, url: str, prefix: str = CACHE_PREFIX, timeout: float = CACHE_TIMEOUT, max_idle: int = 16):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.prefix = prefix
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[RedisConnection]" = queue.LifoQueue(maxsize=max_idle)
+        self._stats_lock = threading.Lock()
+        self.errors = 0
+
+    def _connect(self) -> RedisConnection:
+        conn = RedisConnection(self.host, self.port, self.timeout)
+        try:
+            if self.password:
+                conn.execute("AUTH", self.password)
+            if self.db:
+                conn.execute("SELECT", self.db)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def _release(self, conn: RedisConnection):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _execute(self, *args):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+        try:
+            if conn is not None:
+                try:
+                    reply = conn.execute(*args)
+                except OSError:
+                    # Idle connections die with a server restart or an idle timeout; that
+                    # says nothing about the server now, so retry once on a fresh one.
+                    conn.close()
+                    conn = None
+                else:
+                    self._release(conn)
+                    return reply
+            conn = self._connect()
+            reply = conn.execute(*args)
+        except RedisError as exc:
+            # The server answered, so the connection is still in step and can be reused.
+            if conn is not None:
+                self._release(conn)
+            self._failed(args, exc)
+            raise
+        except OSError as exc:
+            if conn is not None:
+                conn.close()
+            self._failed(args, exc)
+            raise
+        self._release(conn)
+        return reply
+
+    def _failed(self, args, exc: Exception):
+        with self._stats_lock:
+            self.errors += 1
+        logger.warning(f"Cache command {args[0]} failed: {exc}")
+
+    def _try(self, *args, default=None):
+        try:
+            return self._execute(*args)
+        except (OSError, RedisError):
+            return default
+
+    @staticmethod
+    def _expiry(ttl: Optional[float]) -> List:
+        return ["PX", max(1, int(ttl * 1000))] if ttl is not None else []
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._try("GET", self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        self._try("SET", self.prefix + key, value, *self._expiry(ttl))
+
+    def add(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        return self._try("SET", self.prefix + key, value, *self._expiry(ttl), "NX") is not None
+
+    def delete(self, key: str):
+        self._try("DEL", self.prefix + key)
+
+    def clear(self):
+        # SCAN rather than FLUSHDB: the database may be shared with other apps.
+        cursor = b"0"
+        while True:
+            reply = self._try("SCAN", cursor, "MATCH", self.prefix + "*", "COUNT", 500)
+            if reply is None:
+                return
+            cursor, keys = reply
+            if keys:
+                self._try("DEL", *keys)
+            if cursor == b"0":
+                return
+
+    def stats(self) -> dict:
+        return {"backend": "redis", "host": f"{self.host}:{self.port}/{self.db}", "errors": self.errors}
+
+
+def make_backend(url: str = CACHE_URL) -> CacheBackend:
+    scheme = urlparse(url).scheme
+    if scheme == "memory":
+        return LocalCacheBackend()
+    if scheme == "redis":
+        return RedisCacheBackend(url)
+    raise ValueError(f"Unsupported CACHE_URL scheme: {scheme!r}")
@@ -1,6 +1,10 @@
 # app/crud.py
-from sqlalchemy.orm import Session
-from app import models, schema
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import Float, Integer, bindparam, case, delete, exists, insert, literal, select, update
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from app import fieldsets, leaderboard, models, response_cache, schema, search
 from app.models import User 
 from app.logger import get_logger
 
@@ -13,87 +17,387 @@ def get_user(db: Session, user_id: int):
 def get_user_by_username(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
 
+# Writes are single INSERT/UPDATE/DELETE ... RETURNING statements (SQLite 3.35+ or Postgres)
+# and hand back Row snapshots of these columns, instead of add/commit/refresh round trips.
+USER_COLUMNS = (models.User.id, models.User.username, models.User.email)
+MOVIE_COLUMNS = (
+    models.Movie.id, models.Movie.title, models.Movie.description, models.Movie.user_id,
+    models.Movie.rating_count, models.Movie.rating_avg, models.Movie.version,
+)
+COMMENT_COLUMNS = (
+    models.Comment.id, models.Comment.content, models.Comment.movie_id,
+    models.Comment.user_id, models.Comment.parent_comment_id,
+)
+RATING_COLUMNS = (models.Rating.id, models.Rating.score, models.Rating.movie_id, models.Rating.user_id)
+
+def _insert_many(db: Session, model, columns, rows: List[dict]):
+    """executemany INSERT ... RETURNING `columns`, with the rows handed back in input order."""
+    if db.get_bind().dialect.name != "sqlite":
+        return db.execute(insert(model).returning(*columns, sort_by_parameter_order=True), rows).all()
+    # SQLAlchemy can't match SQLite's RETURNING rows to parameters and would fall back to one INSERT
+    # per row. SQLite hands out rowids in VALUES order, so a multi-row INSERT sorted by id is in order.
+    return sorted(db.execute(insert(model).returning(*columns), rows).all(), key=lambda row: row.id)
+
 def create_user(db: Session, user: schema.UserCreate, hashed_password: str):
-    db_user = models.User(username=user.username, email=user.email, hashed_password=hashed_password)
-    db.add(db_user)
+    db_user = db.execute(
+        insert(models.User)
+        .values(username=user.username, email=user.email, hashed_password=hashed_password)
+        .returning(*USER_COLUMNS)
+    ).one()
+    db.commit()
+    return db_user
+
+def update_user_password(db: Session, db_user: models.User, hashed_password: str):
+    db_user.hashed_password = hashed_password
     db.commit()
     db.refresh(db_user)
     return db_user
 
 #Movies
-def get_movie(db: Session, movie_id: int):
-    movie = db.query(models.Movie).filter(models.Movie.id == movie_id).first()
+# schema.Movie serializes comments (with nested replies) and ratings; load both up front
+# so a movie read is movie + comments + ratings = 3 queries however many comments it has.
+MOVIE_READ_OPTIONS = (selectinload(models.Movie.comments), selectinload(models.Movie.ratings))
+
+def attach_replies(comments):
+    """Fill `replies` from comments that are already loaded, instead of one lazy load per comment.
+
+    Movie.comments holds every comment on the movie, replies included, so the whole
+    thread can be wired up in memory.
+    """
+    children = defaultdict(list)
+    for comment in sorted(comments, key=lambda comment: comment.id):
+        if comment.parent_comment_id is not None:
+            children[comment.parent_comment_id].append(comment)
+    for comment in comments:
+        set_committed_value(comment, "replies", children.get(comment.id, []))
+    return comments
+
+def _attach_movie_replies(movies, fieldset: Optional[fieldsets.MovieFieldset] = None):
+    if fieldset is None or "comments" in fieldset.include:
+        for movie in movies:
+            attach_replies(movie.comments)
+    return movies
+
+def _movie_options(fieldset: Optional[fieldsets.MovieFieldset]):
+    return MOVIE_READ_OPTIONS if fieldset is None else fieldsets.movie_load_options(fieldset)
+
+def get_movie(db: Session, movie_id: int, fieldset: Optional[fieldsets.MovieFieldset] = None):
+    """Load one movie; with a fieldset, only its columns and included relationships are fetched."""
+    movie = db.query(models.Movie).filter(models.Movie.id == movie_id).options(*_movie_options(fieldset)).first()
     if movie:
-        # Ensure all fields are populated correctly
-        for comment in movie.comments:
-            if comment.user_id is None:
-                comment.user_id = 0  # or another default value, depending on your use case
+        _attach_movie_replies([movie], fieldset)
         return movie
     return None
 
 
-def get_movies(db: Session, movie_id:int):
-    """Fetch a list of movies with pagination support."""
-    return db.query(models.Movie).filter(models.Movie.id==movie_id).all()
+def get_movies(db: Session, movie_id: Optional[int] = None, after: Optional[int] = None, limit: int = 20, fieldset: Optional[fieldsets.MovieFieldset] = None):
+    """Fetch a list of movies with pagination support.
+
+    Pages are keyset-based on the primary key (`id > after`), so deep pages cost the
+    same index seek as the first one instead of scanning past OFFSET rows.
+    """
+    query = db.query(models.Movie).options(*_movie_options(fieldset))
+    if movie_id is not None:
+        return _attach_movie_replies(query.filter(models.Movie.id == movie_id).all(), fieldset)
+    if after is not None:
+        query = query.filter(models.Movie.id > after)
+    return _attach_movie_replies(query.order_by(models.Movie.id).limit(limit).all(), fieldset)
+
+def get_movies_by_ids(db: Session, movie_ids: List[int]):
+    """Fetch many movies with one IN query, loading comments and ratings in bulk.
+
+    Returns the movies in the requested order plus the IDs that don't exist.
+    """
+    movie_ids = list(dict.fromkeys(movie_ids))
+    if not movie_ids:
+        return [], []
+    rows = (
+        db.query(models.Movie)
+        .filter(models.Movie.id.in_(movie_ids))
+        .options(*MOVIE_READ_OPTIONS)
+        .all()
+    )
+    found = {movie.id: movie for movie in _attach_movie_replies(rows)}
+    movies = [found[movie_id] for movie_id in movie_ids if movie_id in found]
+    missing = [movie_id for movie_id in movie_ids if movie_id not in found]
+    return movies, missing
+
+def search_movies(db: Session, q: str, limit: int = 20):
+    """Full-text search over titles and descriptions, best matches first."""
+    statement = search.movie_search_statement(db.get_bind().dialect.name, q, limit)
+    if statement is None:
+        return []
+    return _attach_movie_replies(db.scalars(statement.options(*MOVIE_READ_OPTIONS)).all())
+
+def get_top_movies(db: Session, by: str = "avg", limit: int = 10):
+    """Return (movie, score) pairs from the in-process leaderboard, best first."""
+    leaderboard.board.refresh(db)
+    ranked = leaderboard.board.top(by=by, limit=limit)
+    movies = {movie.id: movie for movie in db.query(models.Movie).filter(models.Movie.id.in_([movie_id for movie_id, _ in ranked]))}
+    return [(movies[movie_id], score) for movie_id, score in ranked if movie_id in movies]
 
 def create_movie(db: Session, movie: schema.MovieCreate, user_id: int):
-    db_movie = models.Movie(title= movie.title,description=movie.description, user_id=user_id)
-    db.add(db_movie)
+    db_movie = db.execute(
+        insert(models.Movie)
+        .values(title=movie.title, description=movie.description, user_id=user_id)
+        .returning(*MOVIE_COLUMNS)
+    ).one()
+    # Drops any cached 404 for the new id.
+    response_cache.mark_movie(db, db_movie.id)
     db.commit()
-    db.refresh(db_movie)
     return db_movie
 
 def update_movie(db: Session, movie_id: int, movie: schema.MovieUpdate, user_id: int):
-    db_movie = db.query(models.Movie).filter(models.Movie.id == movie_id, models.Movie.user_id == user_id).first()
+    """Update the movie if `user_id` owns it; returns the new row, or None if not found or not owned."""
+    db_movie = db.execute(
+        update(models.Movie)
+        .where(models.Movie.id == movie_id, models.Movie.user_id == user_id)
+        .values(**movie.model_dump(), version=models.Movie.version + 1)
+        .returning(*MOVIE_COLUMNS)
+        .execution_options(synchronize_session=False)
+    ).first()
     if db_movie:
-        for key, value in movie.model_dump().items():
-            setattr(db_movie, key, value)
-        db.commit()
-        db.refresh(db_movie)
+        response_cache.mark_movie(db, movie_id)
+    db.commit()
     return db_movie
 
 
 def delete_movie(db: Session, movie_id: int, user_id: int):
-    db_movie = db.query(models.Movie).filter(models.Movie.id == movie_id, models.Movie.user_id == user_id).first()
+    """Delete the movie if `user_id` owns it; returns the deleted row, or None."""
+    # Comments and ratings are kept but detached, as the ORM cascade used to do; this has
+    # to happen first so the foreign keys never point at a missing movie.
+    owned = exists().where(models.Movie.id == movie_id, models.Movie.user_id == user_id)
+    for child in (models.Comment, models.Rating):
+        db.execute(
+            update(child)
+            .where(child.movie_id == movie_id, owned)
+            .values(movie_id=None)
+            .execution_options(synchronize_session=False)
+        )
+    db_movie = db.execute(
+        delete(models.Movie)
+        .where(models.Movie.id == movie_id, models.Movie.user_id == user_id)
+        .returning(*MOVIE_COLUMNS)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if db_movie:
+        response_cache.mark_movie(db, movie_id)
+    db.commit()
     if db_movie:
-        db.delete(db_movie)
-        db.commit()
+        leaderboard.board.remove(movie_id)
     return db_movie
 
+def get_existing_movie_ids(db: Session, movie_ids: Iterable[int]) -> set:
+    """The subset of `movie_ids` that exist, from one primary-key IN query."""
+    movie_ids = set(movie_ids)
+    if not movie_ids:
+        return set()
+    return set(db.scalars(select(models.Movie.id).where(models.Movie.id.in_(movie_ids))))
+
+def movie_exists(db: Session, movie_id: int) -> bool:
+    """Primary-key EXISTS check for write paths; loads no columns or relationships."""
+    return db.scalar(select(exists().where(models.Movie.id == movie_id)))
+
+def get_movie_version(db: Session, movie_id: int) -> Optional[int]:
+    """The movie's current version, or None if it doesn't exist. One primary-key lookup, no entity load."""
+    return db.scalar(select(models.Movie.version).where(models.Movie.id == movie_id))
+
+def bump_movie_version(db: Session, movie_id: int):
+    """Mark the movie changed inside the caller's transaction, e.g. when a comment is added."""
+    bump_movie_versions(db, [movie_id])
+
+def bump_movie_versions(db: Session, movie_ids: Iterable[int]):
+    """bump_movie_version for several movies in one UPDATE."""
+    movie_ids = sorted(set(movie_ids))
+    if not movie_ids:
+        return
+    db.execute(
+        update(models.Movie)
+        .where(models.Movie.id.in_(movie_ids))
+        .values(version=models.Movie.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    for movie_id in movie_ids:
+        response_cache.mark_movie(db, movie_id)
+
 #Comments
 def create_comment(db: Session, comment: schema.CommentCreate, movie_id: int, user_id: int):
-    db_comment = models.Comment(content=comment.content, movie_id=movie_id, user_id=user_id, parent_comment_id=comment.parent_comment_id)
-    db.add(db_comment)
+    db_comment = db.execute(
+        insert(models.Comment)
+        .values(content=comment.content, movie_id=movie_id, user_id=user_id, parent_comment_id=comment.parent_comment_id)
+        .returning(*COMMENT_COLUMNS)
+    ).one()
+    bump_movie_version(db, movie_id)
     db.commit()
-    db.refresh(db_comment)
     return db_comment
 
+def insert_comments(db: Session, rows: List[dict]):
+    """Insert many comments inside the caller's transaction; returns their rows in input order.
+
+    Each row has content, movie_id, user_id and parent_comment_id. One executemany INSERT ... RETURNING,
+    then one version bump covering every movie touched.
+    """
+    if not rows:
+        return []
+    db_comments = _insert_many(db, models.Comment, COMMENT_COLUMNS, rows)
+    bump_movie_versions(db, (row["movie_id"] for row in rows))
+    return db_comments
+
+def comment_exists(db: Session, comment_id: int) -> bool:
+    return db.scalar(select(exists().where(models.Comment.id == comment_id)))
+
+def get_comment_movie(db: Session, comment_id: int):
+    """(id, movie_id) of the comment, or None if it doesn't exist; for attaching replies."""
+    return db.execute(select(models.Comment.id, models.Comment.movie_id).where(models.Comment.id == comment_id)).first()
+
 #fetching comments with nested replies
-def get_comments(db: Session, movie_id: int, skip: int = 0, limit: int = 10):
-    comments = db.query(models.Comment).filter(models.Comment.movie_id == movie_id).offset(skip).limit(limit).all()
-    # Optionally, exclude the replies field or limit the depth
+def get_comments(db: Session, movie_id: int, skip: int = 0, limit: int = 10, after: Optional[int] = None):
+    """Top-level comments on a movie, keyset-paginated on (movie_id, id).
+
+    `skip` is the old OFFSET paging and is ignored once a cursor is given.
+    """
+    query = db.query(models.Comment).filter(models.Comment.movie_id == movie_id, models.Comment.parent_comment_id.is_(None))
+    if after is not None:
+        query = query.filter(models.Comment.id > after)
+    elif skip:
+        query = query.offset(skip)
+    comments = query.order_by(models.Comment.id).limit(limit).all()
+    # Replies are paged separately; set the collection without loading (or dirtying) it.
     for comment in comments:
-        comment.replies = []  # or implement logic to limit the depth of replies
+        set_committed_value(comment, "replies", [])
     return comments
 
+def get_comment_replies(db: Session, comment_id: int, after: Optional[int] = None, limit: int = 10):
+    """Direct replies to a comment, keyset-paginated on (parent_comment_id, id)."""
+    query = db.query(models.Comment).filter(models.Comment.parent_comment_id == comment_id)
+    if after is not None:
+        query = query.filter(models.Comment.id > after)
+    replies = query.order_by(models.Comment.id).limit(limit).all()
+    for reply in replies:
+        set_committed_value(reply, "replies", [])
+    return replies
+
 #get comment by ID
 def get_comment(db: Session, comment_id: int, depth: int = 1):
-    comment = db.query(models.Comment).filter(models.Comment.id == comment_id).first()
-    if comment:
-        # Limit the depth of replies based on the 'depth' parameter
-        if depth > 1:
-            for reply in comment.replies:
-                reply.replies = []  # or recursively call get_comment_with_replies with depth-1
-    return comment
+    """Fetch a comment with `depth` levels of replies populated."""
+    return get_comment_thread(db, comment_id, max_depth=depth)
+
+def get_comment_thread(db: Session, comment_id: int, max_depth: int = 5):
+    """Load a comment and its replies down to `max_depth` levels in one round trip.
+
+    A WITH RECURSIVE query walks parent_comment_id from the root, then the tree is
+    wired up in memory; replies below `max_depth` come back as empty lists.
+    """
+    thread = (
+        select(models.Comment.id, literal(0).label("depth"))
+        .where(models.Comment.id == comment_id)
+        .cte("thread", recursive=True)
+    )
+    thread = thread.union_all(
+        select(models.Comment.id, (thread.c.depth + 1).label("depth"))
+        .join(thread, models.Comment.parent_comment_id == thread.c.id)
+        .where(thread.c.depth < max_depth)
+    )
+    comments = db.scalars(
+        select(models.Comment).join(thread, models.Comment.id == thread.c.id).order_by(models.Comment.id)
+    ).all()
+    attach_replies(comments)
+    return next((comment for comment in comments if comment.id == comment_id), None)
 
 
 #Ratings
+def apply_rating_delta(db: Session, movie_id: int, count_delta: int, score_delta: float):
+    """Adjust a movie's rating aggregates inside the caller's transaction.
+
+    The arithmetic happens in the UPDATE itself, so concurrent writers can't lose increments.
+    Call with (1, score) on insert, (-1, -score) on delete and (0, new - old) on update.
+    """
+    result = db.execute(
+        update(models.Movie)
+        .where(models.Movie.id == movie_id)
+        .values(**_rating_aggregate_values(models.Movie, count_delta, score_delta))
+        .execution_options(synchronize_session=False)
+    )
+    response_cache.mark_movie(db, movie_id)
+    return result.rowcount
+
+def apply_rating_deltas(db: Session, deltas: Dict[int, Tuple[int, float]]) -> Dict[int, Tuple[int, float]]:
+    """apply_rating_delta for many movies as one executemany UPDATE; `deltas` maps movie_id -> (count, score).
+
+    Returns the deltas of the movies that were found, for the leaderboard.
+    """
+    if not deltas:
+        return {}
+    movies = models.Movie.__table__
+    result = db.execute(
+        update(movies)
+        .where(movies.c.id == bindparam("delta_movie_id"))
+        .values(**_rating_aggregate_values(movies.c, bindparam("count_delta", type_=Integer), bindparam("score_delta", type_=Float))),
+        [
+            {"delta_movie_id": movie_id, "count_delta": count, "score_delta": score}
+            for movie_id, (count, score) in sorted(deltas.items())
+        ],
+    )
+    for movie_id in deltas:
+        response_cache.mark_movie(db, movie_id)
+    if db.get_bind().dialect.supports_sane_multi_rowcount and result.rowcount == len(deltas):
+        return deltas
+    found = get_existing_movie_ids(db, deltas)
+    return {movie_id: delta for movie_id, delta in deltas.items() if movie_id in found}
+
+def _rating_aggregate_values(movie, count_delta, score_delta) -> dict:
+    new_count = movie.rating_count + count_delta
+    new_sum = movie.rating_sum + score_delta
+    return {
+        "rating_count": new_count,
+        "rating_sum": new_sum,
+        "rating_avg": case((new_count > 0, new_sum / new_count), else_=None),
+        "version": movie.version + 1,
+    }
+
+def rating_deltas(rows: Iterable[dict]) -> Dict[int, Tuple[int, float]]:
+    """Sum (count, score) per movie_id over rating rows."""
+    deltas: Dict[int, Tuple[int, float]] = {}
+    for row in rows:
+        count, score = deltas.get(row["movie_id"], (0, 0.0))
+        deltas[row["movie_id"]] = (count + 1, score + row["score"])
+    return deltas
+
 def create_rating(db: Session, rating: schema.RatingCreate, movie_id: int, user_id: int= None):
-    db_rating = models.Rating(score=rating.score, movie_id=movie_id, user_id=user_id)
-    db.add(db_rating)
+    db_rating = db.execute(
+        insert(models.Rating)
+        .values(score=rating.score, movie_id=movie_id, user_id=user_id)
+        .returning(*RATING_COLUMNS)
+    ).one()
+    movie_found = apply_rating_delta(db, movie_id, 1, rating.score)
     db.commit()
-    db.refresh(db_rating)
+    if movie_found:
+        leaderboard.board.record(movie_id, 1, rating.score)
     return db_rating
 
+def insert_ratings(db: Session, rows: List[dict]):
+    """Insert many ratings inside the caller's transaction.
+
+    Each row has score, movie_id and user_id. One executemany INSERT ... RETURNING, then one
+    aggregate UPDATE per movie instead of per rating. Returns the new rows in input order and
+    the per-movie deltas that were applied; pass those to `record_rating_deltas` after commit.
+    """
+    if not rows:
+        return [], {}
+    db_ratings = _insert_many(db, models.Rating, RATING_COLUMNS, rows)
+    applied = apply_rating_deltas(db, rating_deltas(rows))
+    return db_ratings, applied
+
+def record_rating_deltas(applied: Dict[int, Tuple[int, float]]):
+    for movie_id, (count, score) in applied.items():
+        leaderboard.board.record(movie_id, count, score)
+
+def create_ratings(db: Session, rows: List[dict]):
+    """insert_ratings in a transaction of its own, then fold the new ratings into the leaderboard."""
+    db_ratings, applied = insert_ratings(db, rows)
+    db.commit()
+    record_rating_deltas(applied)
+    return db_ratings
+
 def get_ratings(db: Session, movie_id: int):
     return db.query(models.Rating).filter(models.Rating.movie_id == movie_id).all()
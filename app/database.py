@@ -1,6 +1,9 @@
 import os
+import re
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, pool
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -23,11 +26,97 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(ACCESS_TOKEN_EXPIRE_MINUTES)
 
 
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL
-)
+# SQLite production profile. WAL lets readers and the single writer proceed concurrently,
+# and busy_timeout makes a blocked writer wait instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", -64 * 1024)),  # negative means KiB
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000)),  # milliseconds
+}
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+
+for name, value in SQLITE_PRAGMAS.items():
+    if not re.fullmatch(r"-?\w+", str(value)):
+        raise ValueError(f"Invalid value for SQLite pragma {name}: {value!r}")
+
+def is_sqlite(url) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+def _is_sqlite_memory(url) -> bool:
+    url = make_url(url)
+    return url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"
+
+def engine_options(url, asynchronous: bool = False) -> dict:
+    """Engine keyword arguments for `url`; SQLite gets a connection pool that is safe across threads."""
+    pool_options = {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_timeout": DB_POOL_TIMEOUT}
+    if not is_sqlite(url):
+        return {**pool_options, "pool_pre_ping": True}
+    # Each pooled connection is used by one request at a time but not always on the thread
+    # that opened it (threadpool workers, aiosqlite), hence check_same_thread=False.
+    options = {"connect_args": {"check_same_thread": False, "timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000}}
+    if not _is_sqlite_memory(url):
+        # aiosqlite would otherwise default to NullPool and reconnect (and re-run pragmas) per request.
+        options.update(pool_options, poolclass=pool.AsyncAdaptedQueuePool if asynchronous else pool.QueuePool)
+    return options
+
+def is_read_only(url) -> bool:
+    return make_url(url).query.get("mode") == "ro"
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+def apply_sqlite_read_pragmas(dbapi_connection, connection_record):
+    # A mode=ro connection can't change the journal mode; it reads whatever the writer set.
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        if name != "journal_mode":
+            cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+def _listen_for_pragmas(sync_engine, url):
+    if is_sqlite(url):
+        listener = apply_sqlite_read_pragmas if is_read_only(url) else apply_sqlite_pragmas
+        event.listen(sync_engine, "connect", listener)
+
+def make_engine(url):
+    new_engine = create_engine(url, **engine_options(url))
+    _listen_for_pragmas(new_engine, url)
+    return new_engine
+
+# Async drivers for the same database, used by the read endpoints that run on the event loop.
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+def to_async_url(url: str):
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    return url.set(drivername=driver) if driver else url
+
+def make_async_engine(url):
+    new_engine = create_async_engine(to_async_url(url), **engine_options(url, asynchronous=True))
+    _listen_for_pragmas(new_engine.sync_engine, url)
+    return new_engine
+
+# Writes go to DB_URL. Reads go to DB_READ_URL when it is set: a replica, or the same SQLite
+# file opened read-only (sqlite:///file:./app.db?mode=ro&uri=true). Otherwise they share DB_URL.
+SQLALCHEMY_READ_DATABASE_URL = os.getenv('DB_READ_URL') or SQLALCHEMY_DATABASE_URL
+
+engine = make_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+read_engine = engine if SQLALCHEMY_READ_DATABASE_URL == SQLALCHEMY_DATABASE_URL else make_engine(SQLALCHEMY_READ_DATABASE_URL)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Async sessions only serve reads, so they are bound to the read side.
+async_engine = make_async_engine(SQLALCHEMY_READ_DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 # Dependency
@@ -38,6 +127,17 @@ def get_db():
    finally:
         db.close()
         
+def get_read_db():
+   db = ReadSessionLocal()
+   try:
+        yield db
+   finally:
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 
 def init_db():
     Base.metadata.create_all(bind=engine)
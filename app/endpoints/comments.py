@@ -1,29 +1,71 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
-from app import crud, schema, auth
-from app.database import get_db
+from typing import List, Optional
+from app import async_crud, crud, schema, auth, etags, lanes, pagination, response_cache, write_behind
+from app.database import get_async_db, get_db, get_read_db
 from app.auth import create_access_token, authenticate_user
 
 router = APIRouter()
 
 #endpoints/comment
-@router.post("/{movie_id}/", response_model=schema.Comment)
+@router.post("/{movie_id}/", response_model=schema.Comment, dependencies=[lanes.WRITE])
 def create_comment(movie_id: int, comment: schema.CommentCreate, db: Session = Depends(get_db), current_user: schema.User = Depends(auth.get_current_user)):
-    db_movie = crud.get_movie(db, movie_id=movie_id)
-    if not db_movie:
+    if not crud.movie_exists(db, movie_id):
         raise HTTPException(status_code=404, detail="Movie not found")
     
     # Check if parent_comment_id is provided and exists
     if comment.parent_comment_id:
-        parent_comment = crud.get_comment(db, comment.parent_comment_id)
-        if not parent_comment:
+        if not crud.comment_exists(db, comment.parent_comment_id):
             raise HTTPException(status_code=404, detail="Parent comment not found")
     
-    return crud.create_comment(db=db, comment=comment, movie_id=movie_id, user_id=current_user.id)
+    return write_behind.create_comment(db=db, comment=comment, movie_id=movie_id, user_id=current_user.id)
 
-@router.get("/{movie_id}/", response_model=list[schema.Comment])
-def read_comments(movie_id: int, db: Session = Depends(get_db), skip: int = 0, limit: int = 10):
-    comments= crud.get_comments(db, movie_id=movie_id, skip=skip, limit=limit)
-    
-    return comments
+async def serve_comments(movie_id: int, skip: int, limit: int, after: Optional[str], if_none_match: Optional[str], db: AsyncSession):
+    """The cached, ETag-aware comments page behind both /comments/{id}/ and /movies/{id}/comments."""
+    try:
+        after_id = pagination.decode_cursor(after) if after else None
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    key = ("comments", skip, limit, after_id)
+    cached, generation = await response_cache.lookup(movie_id, key)
+    if cached is not None:
+        return cached.to_response(if_none_match)
+    headers = {}
+    version = await async_crud.get_movie_version(db, movie_id)
+    if version is not None:
+        etag = etags.movie_etag("comments", movie_id, version, skip, limit, after_id)
+        if etags.matches(if_none_match, etag):
+            return etags.not_modified(etag)
+        headers["ETag"] = etag
+    comments = await async_crud.get_comments(db, movie_id=movie_id, skip=skip, limit=limit + 1, after=after_id)
+    comments, next_cursor = pagination.paginate(comments, limit, key=lambda comment: comment.id)
+    if next_cursor:
+        headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    body = response_cache.render(comments, List[schema.Comment])
+    entry = await response_cache.store(movie_id, generation, key, body, headers)
+    return entry.to_response()
+
+@router.get("/{movie_id}/", response_model=list[schema.Comment], dependencies=[lanes.READ])
+async def read_comments(movie_id: int, db: AsyncSession = Depends(get_async_db), skip: int = 0, limit: int = Query(10, ge=1, le=100), after: Optional[str] = None, if_none_match: Optional[str] = Header(None)):
+    return await serve_comments(movie_id, skip, limit, after, if_none_match, db)
+
+@router.get("/{comment_id}/replies", response_model=list[schema.Comment], dependencies=[lanes.READ])
+def read_comment_replies(comment_id: int, response: Response, db: Session = Depends(get_read_db), limit: int = Query(10, ge=1, le=100), after: Optional[str] = None):
+    try:
+        after_id = pagination.decode_cursor(after) if after else None
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    replies = crud.get_comment_replies(db, comment_id, after=after_id, limit=limit + 1)
+    replies, next_cursor = pagination.paginate(replies, limit, key=lambda reply: reply.id)
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+    return replies
+
+@router.get("/{comment_id}/thread", response_model=schema.Comment, dependencies=[lanes.READ])
+def read_comment_thread(comment_id: int, max_depth: int = Query(5, ge=0, le=50), db: Session = Depends(get_read_db)):
+    comment = crud.get_comment_thread(db, comment_id, max_depth=max_depth)
+    if not comment:
+        raise HTTPException(status_code=404, detail="Comment not found")
+    return comment
@@ -1,52 +1,153 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
 from app import schema
-from app.database import get_db
+from app.database import AsyncSessionLocal, get_async_db, get_db, get_read_db
 from app.auth import create_access_token, authenticate_user, get_current_user
-from app import auth, crud
-from typing import List
+from app import async_crud, auth, crud, etags, fieldsets, lanes, pagination, response_cache, single_flight
+from app.logger import get_logger
+from typing import List, Optional
+
+logger = get_logger(__name__)
 
 router = APIRouter()
 
 #endpoints/movies
-@router.post("/", response_model=schema.Movie)
+@router.post("/", response_model=schema.MovieRecord, dependencies=[lanes.WRITE])
 def create_movie(movie: schema.MovieCreate, db: Session = Depends(get_db), current_user: schema.User = Depends(get_current_user)):
     return crud.create_movie(db=db, movie=movie, user_id=current_user.id)
 
 
-@router.get("/{movie_id}", response_model=schema.Movie)
-def read_movie(movie_id: int, db: Session = Depends(get_db)):
-    db_movie = crud.get_movie(db, movie_id=movie_id)
-    if not db_movie:
-        raise HTTPException(status_code=404, detail="Movie not found")
-    return db_movie
+@router.get("/search", response_model=List[schema.Movie], dependencies=[lanes.READ])
+def search_movies(q: str = Query(..., min_length=1), limit: int = Query(20, ge=1, le=100), db: Session = Depends(get_read_db)):
+    return crud.search_movies(db, q, limit=limit)
 
-@router.get("/", response_model=List[schema.Movie])
-def read_movies(movie_id: int, db: Session = Depends(get_db)):
-    movies= crud.get_movies(db, movie_id)
-    
+
+@router.get("/batch", response_model=schema.MovieBatch, dependencies=[lanes.READ])
+def read_movies_batch(ids: str = Query(..., description="Comma-separated movie IDs"), db: Session = Depends(get_read_db)):
+    try:
+        movie_ids = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    if len(movie_ids) > schema.MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {schema.MAX_BATCH_IDS} ids per request")
+    movies, missing = crud.get_movies_by_ids(db, movie_ids)
+    return {"movies": movies, "missing": missing}
+
+
+@router.post("/batch", response_model=schema.MovieBatch, dependencies=[lanes.READ])
+def read_movies_batch_post(payload: schema.MovieBatchRequest, db: Session = Depends(get_read_db)):
+    movies, missing = crud.get_movies_by_ids(db, payload.ids)
+    return {"movies": movies, "missing": missing}
+
+
+@router.get("/top", response_model=List[schema.MovieRank], dependencies=[lanes.READ])
+def read_top_movies(
+    by: str = Query("avg", pattern="^(avg|count|bayesian)$"),
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_read_db),
+):
+    return [
+        schema.MovieRank(id=movie.id, title=movie.title, rating_count=movie.rating_count, rating_avg=movie.rating_avg, score=score)
+        for movie, score in crud.get_top_movies(db, by=by, limit=limit)
+    ]
+
+
+async def serve_movie(movie_id: int, fieldset: Optional[fieldsets.MovieFieldset], if_none_match: Optional[str], db: AsyncSession):
+    """The cached, ETag-aware movie read behind both /movies/{id} and /movie/{id}."""
+    key = ("movie", fieldset)
+    cached, generation = await response_cache.lookup(movie_id, key, allow_stale=True)
+
+    async def load():
+        # Runs once for all concurrent identical requests, so it gets its own session.
+        async with AsyncSessionLocal() as session:
+            db_movie = await async_crud.get_movie(session, movie_id=movie_id, fieldset=fieldset)
+            if not db_movie:
+                logger.error(f'Movie with ID {movie_id} not found.')
+                return await response_cache.store_not_found(movie_id, generation, key, "Movie not found")
+            etag = etags.movie_etag("movie", movie_id, db_movie.version, fieldset)
+            if fieldset:
+                body = response_cache.render(fieldsets.render_movie(db_movie, fieldset))
+            else:
+                body = response_cache.render(db_movie, schema.Movie)
+        return await response_cache.store(movie_id, generation, key, body, {"ETag": etag})
+
+    if cached is not None:
+        logger.info(f'Movie with ID {movie_id} served from cache.')
+        if cached.is_stale:
+            # Serve what we have now; one background load replaces it.
+            single_flight.movie_reads.refresh((movie_id, generation, key), load)
+        return cached.to_response(if_none_match)
+    if if_none_match:
+        # Revalidation: answer from the version alone when the client's copy is current.
+        version = await async_crud.get_movie_version(db, movie_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Movie not found")
+        etag = etags.movie_etag("movie", movie_id, version, fieldset)
+        if etags.matches(if_none_match, etag):
+            return etags.not_modified(etag)
+
+    # Only readers that saw the same generation share a load, so one that looked up after a
+    # write never joins a load that started before it.
+    entry = await single_flight.movie_reads.do((movie_id, generation, key), load)
+    return entry.to_response()
+
+
+@router.get("/{movie_id}", response_model=schema.Movie, dependencies=[lanes.READ])
+async def read_movie(movie_id: int, fields: Optional[str] = None, include: Optional[str] = None, if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)):
+    try:
+        fieldset = fieldsets.parse_movie_fieldset(fields, include)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return await serve_movie(movie_id, fieldset, if_none_match, db)
+
+@router.get("/", response_model=List[schema.Movie], dependencies=[lanes.READ])
+async def read_movies(
+    response: Response,
+    movie_id: Optional[int] = None,
+    after: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    fields: Optional[str] = None,
+    include: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    try:
+        fieldset = fieldsets.parse_movie_fieldset(fields, include)
+        after_id = pagination.decode_cursor(after) if after else None
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if movie_id is not None:
+        movies, next_cursor = await async_crud.get_movies(db, movie_id=movie_id, fieldset=fieldset), None
+    else:
+        movies = await async_crud.get_movies(db, after=after_id, limit=limit + 1, fieldset=fieldset)
+        movies, next_cursor = pagination.paginate(movies, limit, key=lambda movie: movie.id)
+    headers = {pagination.NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+    if fieldset:
+        return JSONResponse([fieldsets.render_movie(movie, fieldset) for movie in movies], headers=headers)
+    response.headers.update(headers)
     return movies
     
 
-@router.put("/{movie_id}", response_model=schema.Movie)
-def update_movie(movie_id: int, movie: schema.MovieCreate, db: Session = Depends(get_db), current_user: schema.User = Depends(auth.get_current_user)):
-    db_movie = crud.get_movie(db, movie_id=movie_id)
-    if not db_movie:
+def raise_for_owner(db: Session, movie_id: int, action: str):
+    """Explain why an owner-scoped write matched no row: the movie is missing (404) or not yours (403)."""
+    if not crud.movie_exists(db, movie_id):
         raise HTTPException(status_code=404, detail="Movie not found")
-    if db_movie.user_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized to update this movie")
+    raise HTTPException(status_code=403, detail=f"Not authorized to {action} this movie")
+
+
+@router.put("/{movie_id}", response_model=schema.MovieRecord, dependencies=[lanes.WRITE])
+def update_movie(movie_id: int, movie: schema.MovieCreate, db: Session = Depends(get_db), current_user: schema.User = Depends(auth.get_current_user)):
     updated_movie = crud.update_movie(db=db, movie_id=movie_id, movie=movie, user_id=current_user.id)
     if not updated_movie:
-        raise HTTPException(status_code=404, detail="Movie not found")
+        raise_for_owner(db, movie_id, "update")
     return updated_movie
     
 
-@router.delete("/{movie_id}", response_model=schema.Movie)
+@router.delete("/{movie_id}", response_model=schema.MovieRecord, dependencies=[lanes.WRITE])
 def delete_movie(movie_id: int, db: Session = Depends(get_db), current_user: schema.User = Depends(auth.get_current_user)):
-    db_movie = crud.get_movie(db, movie_id=movie_id)
-    if not db_movie:
-        raise HTTPException(status_code=404, detail="Movie not found")
-    if db_movie.user_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not authorized to delete this movie")
-    return crud.delete_movie(db=db, movie_id=movie_id, user_id=current_user.id)
+    deleted_movie = crud.delete_movie(db=db, movie_id=movie_id, user_id=current_user.id)
+    if not deleted_movie:
+        raise_for_owner(db, movie_id, "delete")
+    return deleted_movie
@@ -1,24 +1,53 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
 from app import schema
-from app.database import get_db
+from app.database import get_async_db, get_db
+from typing import List, Optional
 from app.auth import create_access_token, authenticate_user
-from app import auth, crud
+from app import async_crud, auth, crud, etags, lanes, response_cache, write_behind
 
 router = APIRouter()
 
 #endpoints/ratings
-@router.post("/{movie_id}/", response_model=schema.Rating)
+@router.post("/bulk", response_model=schema.RatingBulkResult, dependencies=[lanes.WRITE])
+def create_ratings_bulk(payload: schema.RatingBulkRequest, db: Session = Depends(get_db), current_user: schema.User = Depends(auth.get_current_user)):
+    """Rate many movies at once, e.g. when importing ratings: all of them are stored or none are."""
+    requested = {item.movie_id for item in payload.ratings}
+    missing = sorted(requested - crud.get_existing_movie_ids(db, requested))
+    if missing:
+        shown = ", ".join(map(str, missing[:20])) + (" ..." if len(missing) > 20 else "")
+        raise HTTPException(status_code=404, detail=f"Movies not found: {shown}")
+    rows = [{"score": item.score, "movie_id": item.movie_id, "user_id": current_user.id} for item in payload.ratings]
+    db_ratings = crud.create_ratings(db, rows)
+    return {"created": len(db_ratings), "ids": [rating.id for rating in db_ratings]}
+
+@router.post("/{movie_id}/", response_model=schema.Rating, dependencies=[lanes.WRITE])
 def create_rating(movie_id: int, rating: schema.RatingCreate, db: Session = Depends(get_db), current_user: schema.User = Depends(auth.get_current_user)):
-    db_movie = crud.get_movie(db, movie_id=movie_id)
-    if not db_movie:
+    if not crud.movie_exists(db, movie_id):
         raise HTTPException(status_code=404, detail="Movie not found")
-    db_rating = crud.create_rating(db=db, rating=rating, movie_id=movie_id, user_id=current_user.id)
+    db_rating = write_behind.create_rating(db=db, rating=rating, movie_id=movie_id, user_id=current_user.id)
     return db_rating
 
-@router.get("/{movie_id}/", response_model=list[schema.Rating])
-def read_ratings(movie_id: int, db: Session = Depends(get_db)):
-    ratings = crud.get_ratings(db, movie_id=movie_id)
-    return ratings 
-    
\ No newline at end of file
+async def serve_ratings(movie_id: int, if_none_match: Optional[str], db: AsyncSession):
+    """The cached, ETag-aware ratings read behind both /ratings/{id}/ and /movies/{id}/ratings."""
+    key = ("ratings",)
+    cached, generation = await response_cache.lookup(movie_id, key)
+    if cached is not None:
+        return cached.to_response(if_none_match)
+    headers = {}
+    version = await async_crud.get_movie_version(db, movie_id)
+    if version is not None:
+        etag = etags.movie_etag("ratings", movie_id, version)
+        if etags.matches(if_none_match, etag):
+            return etags.not_modified(etag)
+        headers["ETag"] = etag
+    ratings = await async_crud.get_ratings(db, movie_id=movie_id)
+    body = response_cache.render(ratings, List[schema.Rating])
+    entry = await response_cache.store(movie_id, generation, key, body, headers)
+    return entry.to_response()
+
+@router.get("/{movie_id}/", response_model=list[schema.Rating], dependencies=[lanes.READ])
+async def read_ratings(movie_id: int, if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)):
+    return await serve_ratings(movie_id, if_none_match, db)
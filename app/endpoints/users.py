@@ -1,23 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from fastapi.security import OAuth2PasswordRequestForm
-from app import schema, crud,auth
-from app.database import get_db
-from app.auth import create_access_token, authenticate_user, get_current_user, get_password_hash, pwd_context
+from app import schema, crud,auth, lanes
+from app.database import get_db, get_read_db
+from app.auth import create_access_token, authenticate_user, get_current_user, get_password_hash
 router = APIRouter()
 
 #endpoints/users
-@router.post("/", response_model=schema.User)
+@router.post("/", response_model=schema.User, dependencies=[lanes.AUTH])
 def create_user(user: schema.UserCreate, db: Session = Depends(get_db)):
     db_user = crud.get_user_by_username(db, username=user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
     
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = get_password_hash(user.password)
     return crud.create_user(db=db, user=user, hashed_password=hashed_password)
     
 
-@router.post("/token", response_model=schema.Token)
+@router.post("/token", response_model=schema.Token, dependencies=[lanes.AUTH])
 def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     user = authenticate_user(db, form_data.username, form_data.password)
     if not user:
@@ -29,6 +29,11 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
     access_token = create_access_token(data={"sub": user.username})
     return {"access_token": access_token, "token_type": "bearer"}
 
-@router.get("/me/", response_model=schema.User)
-def read_users_me(current_user: schema.User = Depends(auth.get_current_user)):
-    return current_user
+@router.get("/me/", response_model=schema.User, dependencies=[lanes.READ])
+def read_users_me(current_user: schema.UserIdentity = Depends(auth.get_current_user), db: Session = Depends(get_read_db)):
+    # The cached identity has no relationships, so load the full user for this response.
+    user = crud.get_user(db, current_user.id)
+    if user is None:
+        # Deleted since the token was issued, or not yet on the read replica.
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
@@ -0,0 +1,33 @@
+import hashlib
+from typing import Optional
+
+from fastapi import Response
+
+# Movie reads are tagged with the movie's row version, which every write to the movie,
+# its comments or its ratings bumps. A poll that still matches can be answered from a
+# single version lookup, without loading rows or running them through pydantic.
+
+
+def movie_etag(kind: str, movie_id: int, version: int, *variant) -> str:
+    """Strong ETag for one representation of a movie resource.
+
+    `kind` names the endpoint's shape (movie, comments, ratings) and `variant` the query
+    parameters that change the body, so different pages or fieldsets never share a tag.
+    """
+    tag = f"{kind}-{movie_id}-v{version}"
+    if any(part is not None for part in variant):
+        digest = hashlib.blake2s(repr(variant).encode(), digest_size=6).hexdigest()
+        tag = f"{tag}-{digest}"
+    return f'"{tag}"'
+
+
+def matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate If-None-Match; per RFC 9110 it uses weak comparison, so a W/ prefix is ignored."""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return any(candidate == "*" or candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
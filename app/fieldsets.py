@@ -0,0 +1,59 @@
+from typing import NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import load_only, raiseload, selectinload
+
+from app import models, schema
+
+MOVIE_FIELDS = ("id", "title", "description", "user_id", "rating_count", "rating_avg")
+MOVIE_RELATIONS = ("comments", "ratings")
+
+
+class MovieFieldset(NamedTuple):
+    fields: Tuple[str, ...]
+    include: Tuple[str, ...]
+
+
+def _split(value: Optional[str]) -> Tuple[str, ...]:
+    return tuple(dict.fromkeys(part.strip() for part in (value or "").split(",") if part.strip()))
+
+
+def parse_movie_fieldset(fields: Optional[str], include: Optional[str]) -> Optional[MovieFieldset]:
+    """Parse `?fields=` and `?include=` into a fieldset, or None for the full legacy response.
+
+    Without `fields` the scalar part defaults to MovieSummary. Raises ValueError on unknown names.
+    """
+    if fields is None and include is None:
+        return None
+    requested = _split(fields) or tuple(schema.MovieSummary.model_fields)
+    relations = _split(include)
+    unknown = [name for name in requested if name not in MOVIE_FIELDS]
+    unknown += [name for name in relations if name not in MOVIE_RELATIONS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    if "id" not in requested:
+        requested = ("id",) + requested
+    return MovieFieldset(requested, relations)
+
+
+def movie_load_options(fieldset: MovieFieldset):
+    """Load only the requested columns and relationships; anything else raises instead of lazy loading.
+
+    `version` is always loaded so the response can carry an ETag.
+    """
+    options = [load_only(models.Movie.version, *(getattr(models.Movie, name) for name in fieldset.fields))]
+    if "comments" in fieldset.include:
+        options.append(selectinload(models.Movie.comments))
+    if "ratings" in fieldset.include:
+        options.append(selectinload(models.Movie.ratings))
+    options.append(raiseload("*"))
+    return options
+
+
+def render_movie(movie: models.Movie, fieldset: MovieFieldset) -> dict:
+    """Serialize just the requested parts; only included relationships go through pydantic."""
+    data = {name: getattr(movie, name) for name in fieldset.fields}
+    if "comments" in fieldset.include:
+        data["comments"] = [schema.Comment.model_validate(comment).model_dump() for comment in movie.comments]
+    if "ratings" in fieldset.include:
+        data["ratings"] = [schema.Rating.model_validate(rating).model_dump() for rating in movie.ratings]
+    return data
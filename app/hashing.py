@@ -0,0 +1,113 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+from app import metrics
+
+# bcrypt cost factor. Stored hashes with any other cost are rehashed on the next login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+# Processes that do the hashing; 0 hashes inline on the calling thread.
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", os.cpu_count() or 1))
+# Hashes allowed in flight (running or queued) before new ones are refused.
+HASH_QUEUE_DEPTH = int(os.getenv("HASH_QUEUE_DEPTH", 32))
+HASH_TIMEOUT = float(os.getenv("HASH_TIMEOUT", 30))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+
+class HashingBusy(Exception):
+    """Raised when HASH_QUEUE_DEPTH hashes are already waiting for a worker."""
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(HASH_QUEUE_DEPTH)
+_stats = {"submitted": 0, "rejected": 0, "timed_out": 0, "in_flight": 0}
+_stats_lock = threading.Lock()
+
+
+def _stats_snapshot() -> dict:
+    with _stats_lock:
+        return dict(_stats, workers=HASH_WORKERS, queue_depth=HASH_QUEUE_DEPTH)
+
+
+metrics.register("password_hashing", _stats_snapshot)
+
+
+def _count(name: str, delta: int = 1):
+    with _stats_lock:
+        _stats[name] += delta
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+        return _executor
+
+
+def _release(future=None):
+    _count("in_flight", -1)
+    _slots.release()
+
+
+def _run(fn, *args):
+    if not _slots.acquire(blocking=False):
+        _count("rejected")
+        raise HashingBusy("Too many password hashes in progress")
+    _count("submitted")
+    _count("in_flight")
+    if HASH_WORKERS <= 0:
+        try:
+            return fn(*args)
+        finally:
+            _release()
+    try:
+        future = _get_executor().submit(fn, *args)
+    except BaseException:
+        _release()
+        raise
+    # The slot is held until the worker is actually done, not just until we stop waiting,
+    # so HASH_QUEUE_DEPTH keeps bounding the work queued on the pool.
+    future.add_done_callback(_release)
+    try:
+        return future.result(timeout=HASH_TIMEOUT)
+    except TimeoutError:
+        future.cancel()
+        _count("timed_out")
+        raise HashingBusy("Password hashing timed out")
+
+
+def hash_password(password: str) -> str:
+    return _run(_hash, password)
+
+
+def verify_password(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Check a password; the second item is a replacement hash when the stored one uses another cost."""
+    return _run(_verify_and_update, password, hashed_password)
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
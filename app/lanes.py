@@ -0,0 +1,107 @@
+import os
+import time
+
+import anyio
+import anyio.to_thread
+from fastapi import Depends
+
+from app import metrics
+
+# Concurrent requests allowed per lane; each request holds at most one worker thread.
+LANE_AUTH_LIMIT = int(os.getenv("LANE_AUTH_LIMIT", 8))
+LANE_READ_LIMIT = int(os.getenv("LANE_READ_LIMIT", 32))
+LANE_WRITE_LIMIT = int(os.getenv("LANE_WRITE_LIMIT", 16))
+# Threads left over for routes outside any lane (health, metrics, ...).
+LANE_SPARE_THREADS = int(os.getenv("LANE_SPARE_THREADS", 8))
+# Longest a request may wait for a slot before it is turned away with a 503.
+LANE_WAIT_TIMEOUT = float(os.getenv("LANE_WAIT_TIMEOUT", 10))
+
+
+class LaneBusy(Exception):
+    """Raised when a request waited LANE_WAIT_TIMEOUT seconds without getting a slot in its lane."""
+
+    def __init__(self, lane: str):
+        super().__init__(f"The {lane} lane is saturated")
+        self.lane = lane
+
+
+class Lane:
+    """A separately sized slice of request concurrency.
+
+    Requests take a slot for as long as they run, so a flood of one kind of
+    traffic queues behind its own limit instead of occupying every thread.
+    """
+
+    def __init__(self, name: str, limit: int, wait_timeout: float = LANE_WAIT_TIMEOUT):
+        self.name = name
+        self.limit = limit
+        self.wait_timeout = wait_timeout
+        self._limiter = None
+        self.acquired = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @property
+    def limiter(self) -> anyio.CapacityLimiter:
+        # Created on first use so it binds to the running event loop.
+        if self._limiter is None:
+            self._limiter = anyio.CapacityLimiter(self.limit)
+        return self._limiter
+
+    async def slot(self):
+        """FastAPI dependency holding one slot in this lane for the rest of the request."""
+        limiter = self.limiter
+        # Borrow on behalf of a per-request token, not the current task, so the
+        # release doesn't depend on which task FastAPI tears the dependency down in.
+        borrower = object()
+        start = time.perf_counter()
+        try:
+            with anyio.fail_after(self.wait_timeout):
+                await limiter.acquire_on_behalf_of(borrower)
+        except TimeoutError:
+            self.rejected += 1
+            raise LaneBusy(self.name)
+        waited = time.perf_counter() - start
+        self.acquired += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        try:
+            yield
+        finally:
+            limiter.release_on_behalf_of(borrower)
+
+    def stats(self) -> dict:
+        in_use = waiting = 0
+        if self._limiter is not None:
+            statistics = self._limiter.statistics()
+            in_use, waiting = statistics.borrowed_tokens, statistics.tasks_waiting
+        return {
+            "limit": self.limit,
+            "in_use": in_use,
+            "waiting": waiting,
+            "acquired": self.acquired,
+            "rejected": self.rejected,
+            "wait_avg_ms": round(self.wait_total / self.acquired * 1000, 3) if self.acquired else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+        }
+
+
+auth = Lane("auth", LANE_AUTH_LIMIT)
+read = Lane("read", LANE_READ_LIMIT)
+write = Lane("write", LANE_WRITE_LIMIT)
+LANES = (auth, read, write)
+
+# Route-level dependencies, e.g. `@router.get(..., dependencies=[lanes.READ])`.
+AUTH = Depends(auth.slot)
+READ = Depends(read.slot)
+WRITE = Depends(write.slot)
+
+metrics.register("lanes", lambda: {lane.name: lane.stats() for lane in LANES})
+
+
+def configure_thread_pool():
+    """Size the shared worker thread pool so every lane can run at its full limit at once."""
+    total = sum(lane.limit for lane in LANES) + LANE_SPARE_THREADS
+    anyio.to_thread.current_default_thread_limiter().total_tokens = total
+    return total
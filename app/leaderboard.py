@@ -0,0 +1,172 @@
+import bisect
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+RANKINGS = ("avg", "count", "bayesian")
+
+# How many "virtual" average ratings a movie starts with under the Bayesian score.
+PRIOR_WEIGHT = float(os.getenv("LEADERBOARD_PRIOR_WEIGHT", "10"))
+# Other workers' ratings only reach this process on rebuild, so bound how stale it can get.
+REFRESH_SECONDS = float(os.getenv("LEADERBOARD_REFRESH_SECONDS", "60"))
+
+
+# Sort key for a ranking: ascending order is best first. Ties go to the movie with more
+# ratings, then to the older movie.
+RankKey = Tuple[float, int, int]
+
+
+class Leaderboard:
+    """In-process ranking of movies, fed by the rating aggregates on `movies`.
+
+    Rebuilding reads one row per rated movie (never the ratings table) and every
+    rating written through this process is folded in immediately. Each ranking is
+    kept as a sorted list that `record` and `remove` update with a binary search,
+    so `top()` is a slice. Bayesian scores depend on the global mean, so that list
+    is re-sorted once per `refresh_seconds`; in between, a movie whose ratings
+    change is re-scored against the mean of the last sort.
+
+    Only one rebuild runs at a time. Deltas recorded while it reads its snapshot
+    are replayed on top of it, so they are not lost; one whose commit the snapshot
+    already saw but whose `record` came after the read started is counted twice
+    until the next rebuild.
+    """
+
+    def __init__(self, prior_weight: float = PRIOR_WEIGHT, refresh_seconds: float = REFRESH_SECONDS):
+        self.prior_weight = prior_weight
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        # Held for a whole rebuild, including its query; reentrant so refresh() can call rebuild().
+        self._rebuild_lock = threading.RLock()
+        # Deltas recorded while a rebuild reads its snapshot, or None when none is running.
+        self._pending: Optional[list] = None
+        self._stats: Dict[int, Tuple[int, float]] = {}
+        self._total_count = 0
+        self._total_sum = 0.0
+        self._built_at: Optional[float] = None
+        self._ranked: Dict[str, List[RankKey]] = {by: [] for by in RANKINGS}
+        self._keys: Dict[str, Dict[int, RankKey]] = {by: {} for by in RANKINGS}
+        self._bayesian_mean = 0.0
+        self._bayesian_sorted_at: Optional[float] = None
+
+    def rebuild(self, db: Session):
+        with self._rebuild_lock:
+            with self._lock:
+                self._pending = []
+            try:
+                rows = (
+                    db.query(models.Movie.id, models.Movie.rating_count, models.Movie.rating_sum)
+                    .filter(models.Movie.rating_count > 0)
+                    .all()
+                )
+            except Exception:
+                with self._lock:
+                    self._pending = None
+                raise
+            stats = {movie_id: (count, total) for movie_id, count, total in rows}
+            with self._lock:
+                pending, self._pending = self._pending, None
+                self._stats = stats
+                self._total_count = sum(count for count, _ in stats.values())
+                self._total_sum = sum(total for _, total in stats.values())
+                for by in ("avg", "count"):
+                    self._keys[by] = {movie_id: self._key(by, movie_id, count, total) for movie_id, (count, total) in stats.items()}
+                    self._ranked[by] = sorted(self._keys[by].values())
+                self._resort_bayesian()
+                for apply, args in pending:
+                    apply(*args)
+                self._built_at = time.monotonic()
+        logger.info(f"Leaderboard rebuilt with {len(stats)} rated movies ({len(pending)} replayed).")
+
+    def refresh(self, db: Session):
+        """Rebuild if stale. Concurrent callers wait for the one rebuild instead of each running it."""
+        if not self.is_stale():
+            return
+        with self._rebuild_lock:
+            if self.is_stale():
+                self.rebuild(db)
+
+    def is_stale(self) -> bool:
+        return self._built_at is None or time.monotonic() - self._built_at > self.refresh_seconds
+
+    def record(self, movie_id: int, count_delta: int, score_delta: float):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((self._record, (movie_id, count_delta, score_delta)))
+            self._record(movie_id, count_delta, score_delta)
+
+    def remove(self, movie_id: int):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((self._remove, (movie_id,)))
+            self._remove(movie_id)
+
+    def top(self, by: str = "avg", limit: int = 10) -> List[Tuple[int, float]]:
+        """Return up to `limit` (movie_id, score) pairs, best first."""
+        if by not in RANKINGS:
+            raise ValueError(f"Unknown ranking: {by}")
+        with self._lock:
+            if by == "bayesian" and self._bayesian_is_stale():
+                self._resort_bayesian()
+            return [(movie_id, -negated_score) for negated_score, _, movie_id in self._ranked[by][:limit]]
+
+    def _record(self, movie_id: int, count_delta: int, score_delta: float):
+        count, total = self._stats.get(movie_id, (0, 0.0))
+        count, total = count + count_delta, total + score_delta
+        self._unrank(movie_id)
+        if count > 0:
+            self._stats[movie_id] = (count, total)
+            self._rank(movie_id, count, total)
+        else:
+            self._stats.pop(movie_id, None)
+        self._total_count += count_delta
+        self._total_sum += score_delta
+
+    def _remove(self, movie_id: int):
+        count, total = self._stats.pop(movie_id, (0, 0.0))
+        self._unrank(movie_id)
+        self._total_count -= count
+        self._total_sum -= total
+
+    def _key(self, by: str, movie_id: int, count: int, total: float) -> RankKey:
+        if by == "count":
+            score = float(count)
+        elif by == "bayesian":
+            m = self.prior_weight
+            score = (m * self._bayesian_mean + total) / (m + count)
+        else:
+            score = total / count
+        return (-score, -count, movie_id)
+
+    def _rank(self, movie_id: int, count: int, total: float):
+        for by in RANKINGS:
+            key = self._key(by, movie_id, count, total)
+            self._keys[by][movie_id] = key
+            bisect.insort(self._ranked[by], key)
+
+    def _unrank(self, movie_id: int):
+        for by in RANKINGS:
+            key = self._keys[by].pop(movie_id, None)
+            if key is not None:
+                ranked = self._ranked[by]
+                del ranked[bisect.bisect_left(ranked, key)]
+
+    def _bayesian_is_stale(self) -> bool:
+        return self._bayesian_sorted_at is None or time.monotonic() - self._bayesian_sorted_at > self.refresh_seconds
+
+    def _resort_bayesian(self):
+        self._bayesian_mean = self._total_sum / self._total_count if self._total_count else 0.0
+        self._keys["bayesian"] = {movie_id: self._key("bayesian", movie_id, count, total) for movie_id, (count, total) in self._stats.items()}
+        self._ranked["bayesian"] = sorted(self._keys["bayesian"].values())
+        self._bayesian_sorted_at = time.monotonic()
+
+
+board = Leaderboard()
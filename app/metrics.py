@@ -0,0 +1,12 @@
+from typing import Callable, Dict
+
+# Name -> zero-argument callable returning a JSON-serializable snapshot.
+_providers: Dict[str, Callable[[], dict]] = {}
+
+
+def register(name: str, provider: Callable[[], dict]):
+    _providers[name] = provider
+
+
+def snapshot() -> dict:
+    return {name: provider() for name, provider in _providers.items()}
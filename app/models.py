@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, ForeignKey, Float, Index
 from sqlalchemy.orm import relationship, registry
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -22,8 +22,14 @@ class Movie(Base):
     __tablename__ = "movies"
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     title = Column(String, index=True, nullable=False)
-    description = Column(String, index=True, nullable=False)
+    description = Column(String, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"))
+    # Denormalized rating aggregates, maintained by crud alongside every rating write.
+    rating_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_sum = Column(Float, nullable=False, default=0.0, server_default="0")
+    rating_avg = Column(Float, nullable=True)
+    # Bumped by every write that changes the movie or its comments/ratings; feeds the ETags.
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     user = relationship("User", back_populates="movies")
     comments = relationship("Comment", back_populates="movie")
@@ -33,7 +39,7 @@ class Movie(Base):
 class Comment(Base):
     __tablename__ = "comments"
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    content = Column(String, index=True, nullable=False)
+    content = Column(String, nullable=False)
     movie_id = Column(Integer, ForeignKey("movies.id"))
     user_id = Column(Integer, ForeignKey("users.id"))
     parent_comment_id = Column(Integer, ForeignKey("comments.id"), nullable=True)
@@ -43,12 +49,18 @@ class Comment(Base):
     parent_comment = relationship("Comment", remote_side=[id], back_populates="replies")
     replies = relationship("Comment", back_populates="parent_comment")
 
+    # Keyset pagination of top-level comments per movie, and of replies per comment.
+    __table_args__ = (
+        Index("ix_comments_movie_id_parent_comment_id_id", "movie_id", "parent_comment_id", "id"),
+        Index("ix_comments_parent_comment_id_id", "parent_comment_id", "id"),
+    )
+
 class Rating(Base):
     __tablename__ = "ratings"
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     score = Column(Float, nullable=False)
-    movie_id = Column(Integer, ForeignKey("movies.id"))
-    user_id = Column(Integer, ForeignKey("users.id"))
+    movie_id = Column(Integer, ForeignKey("movies.id"), index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
 
     movie = relationship("Movie", back_populates="ratings")
     user = relationship("User", back_populates="ratings")
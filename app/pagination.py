@@ -0,0 +1,34 @@
+import base64
+from typing import Callable, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(last_id: int) -> str:
+    """Turn the last seen primary key into an opaque cursor for clients."""
+    return base64.urlsafe_b64encode(f"id:{last_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Recover the primary key from a cursor, raising ValueError if it was tampered with."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        prefix, value = base64.urlsafe_b64decode(padded.encode()).decode().split(":", 1)
+        if prefix != "id":
+            raise ValueError
+        return int(value)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from exc
+
+
+def paginate(rows: List[T], limit: int, key: Callable[[T], int]) -> Tuple[List[T], Optional[str]]:
+    """Split a `limit + 1` fetch into the page and the cursor for the next one.
+
+    Fetching one extra row tells us whether another page exists without a COUNT query.
+    """
+    if len(rows) > limit:
+        page = rows[:limit]
+        return page, encode_cursor(key(page[-1]))
+    return rows, None
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+from functools import lru_cache
+from itertools import chain
+from typing import Any, NamedTuple, Optional, Tuple
+
+import anyio.to_thread
+from fastapi import Response
+from pydantic import TypeAdapter
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app import etags, metrics, models
+from app.cache_backends import CacheBackend, make_backend
+
+# Writes from other processes don't invalidate a memory:// cache, so entries also expire.
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 30))
+# How long past its TTL an entry may still be served while it is refreshed in the background.
+RESPONSE_CACHE_STALE_TTL = float(os.getenv("RESPONSE_CACHE_STALE_TTL", 300))
+# Lifetime of cached 404s. Creating the movie invalidates them sooner.
+RESPONSE_CACHE_NOT_FOUND_TTL = float(os.getenv("RESPONSE_CACHE_NOT_FOUND_TTL", 10))
+
+# Movies touched by the session's current transaction, invalidated once it commits.
+_PENDING = "response_cache_movies"
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    headers: dict
+    status_code: int = 200
+    # Wall-clock time (shared backends outlive any one process) after which the entry is stale.
+    fresh_until: Optional[float] = None
+
+    @property
+    def is_stale(self) -> bool:
+        return self.fresh_until is not None and time.time() >= self.fresh_until
+
+    def to_response(self, if_none_match: Optional[str] = None) -> Response:
+        etag = self.headers.get("ETag")
+        if etag and etags.matches(if_none_match, etag):
+            return etags.not_modified(etag)
+        return Response(content=self.body, status_code=self.status_code, media_type="application/json", headers=self.headers)
+
+    def dumps(self) -> bytes:
+        # The metadata JSON never contains a raw newline, so the first one ends it.
+        meta = {"headers": self.headers, "status": self.status_code, "fresh_until": self.fresh_until}
+        return json.dumps(meta).encode() + b"\n" + self.body
+
+    @classmethod
+    def loads(cls, raw: bytes) -> "CachedResponse":
+        meta, body = raw.split(b"\n", 1)
+        meta = json.loads(meta)
+        return cls(body, meta["headers"], meta["status"], meta["fresh_until"])
+
+
+backend: CacheBackend = make_backend()
+_stats = {"hits": 0, "stale_hits": 0, "misses": 0, "stores": 0, "not_found_stores": 0, "invalidations": 0}
+
+
+def _stats_snapshot() -> dict:
+    lookups = _stats["hits"] + _stats["misses"]
+    return {**_stats, "hit_rate": _stats["hits"] / lookups if lookups else 0.0, **backend.stats()}
+
+
+metrics.register("response_cache", _stats_snapshot)
+
+
+@lru_cache(maxsize=None)
+def _adapter(schema_type) -> TypeAdapter:
+    return TypeAdapter(schema_type)
+
+
+def render(value, schema_type=Any) -> bytes:
+    """Serialize a response body to JSON bytes, validating ORM objects against `schema_type`."""
+    adapter = _adapter(schema_type)
+    if schema_type is not Any:
+        value = adapter.validate_python(value, from_attributes=True)
+    return adapter.dump_json(value)
+
+
+# Every movie has a generation token and its responses are keyed under the current one.
+# Invalidating swaps the token, which orphans the old entries (they age out by TTL/LRU)
+# and works the same whether the backend is per-process or shared. Tokens are never
+# reused, so a token evicted or expired from the backend only costs misses. They expire
+# with the longest-lived entry, so ids nobody asks for again don't pile up in Redis.
+GENERATION_TTL = RESPONSE_CACHE_TTL + RESPONSE_CACHE_STALE_TTL
+
+def _generation_key(movie_id: int) -> str:
+    return f"gen:{movie_id}"
+
+
+def _new_generation() -> bytes:
+    return uuid.uuid4().hex[:16].encode()
+
+
+def _generation(movie_id: int) -> Optional[bytes]:
+    """The movie's current token, or None if the backend can't be read (don't cache then)."""
+    key = _generation_key(movie_id)
+    current = backend.get(key)
+    if current is None:
+        backend.add(key, _new_generation(), GENERATION_TTL)
+        current = backend.get(key)
+    return current
+
+
+def _entry_key(movie_id: int, generation: bytes, key: Tuple) -> str:
+    digest = hashlib.blake2s(repr(key).encode(), digest_size=8).hexdigest()
+    return f"resp:{movie_id}:{generation.decode()}:{digest}"
+
+
+def _lookup(movie_id: int, key: Tuple, allow_stale: bool) -> Tuple[Optional[CachedResponse], Optional[bytes]]:
+    generation = _generation(movie_id)
+    if generation is None:
+        _stats["misses"] += 1
+        return None, None
+    raw = backend.get(_entry_key(movie_id, generation, key))
+    entry = CachedResponse.loads(raw) if raw is not None else None
+    if entry is None or (entry.is_stale and not allow_stale):
+        _stats["misses"] += 1
+        return None, generation
+    _stats["stale_hits" if entry.is_stale else "hits"] += 1
+    return entry, generation
+
+
+def _store(movie_id: int, generation: Optional[bytes], key: Tuple, entry: CachedResponse, ttl: float):
+    if generation is None:
+        # No token to file it under that a write could later invalidate.
+        return
+    backend.set(_entry_key(movie_id, generation, key), entry.dumps(), ttl)
+    _stats["not_found_stores" if entry.status_code == 404 else "stores"] += 1
+
+
+async def _call(fn, *args):
+    if backend.local:
+        return fn(*args)
+    # Network backends block; keep them off the event loop.
+    return await anyio.to_thread.run_sync(fn, *args)
+
+
+async def lookup(movie_id: int, key: Tuple, allow_stale: bool = False) -> Tuple[Optional[CachedResponse], Optional[bytes]]:
+    """Return the cached response for `key` (if any) and the generation to pass to `store`.
+
+    The generation is read before the caller loads anything, so a write that commits in
+    between moves the movie to a new generation and the outdated result is stored where
+    no reader will look. With `allow_stale`, entries past their TTL are returned too
+    (check `is_stale`) so the caller can serve them while it refreshes. The generation is
+    None when the cache can't be read, and `store` then skips caching.
+    """
+    return await _call(_lookup, movie_id, key, allow_stale)
+
+
+async def store(movie_id: int, generation: Optional[bytes], key: Tuple, body: bytes, headers: Optional[dict] = None) -> CachedResponse:
+    ttl = RESPONSE_CACHE_TTL
+    entry = CachedResponse(body, headers or {}, 200, time.time() + ttl)
+    await _call(_store, movie_id, generation, key, entry, ttl + RESPONSE_CACHE_STALE_TTL)
+    return entry
+
+
+async def store_not_found(movie_id: int, generation: Optional[bytes], key: Tuple, detail: str) -> CachedResponse:
+    """Cache a 404 briefly; it is never served stale."""
+    entry = CachedResponse(json.dumps({"detail": detail}).encode(), {}, 404)
+    await _call(_store, movie_id, generation, key, entry, RESPONSE_CACHE_NOT_FOUND_TTL)
+    return entry
+
+
+def invalidate(movie_id: int):
+    backend.set(_generation_key(movie_id), _new_generation(), GENERATION_TTL)
+    _stats["invalidations"] += 1
+
+
+def mark_movie(db: Session, movie_id: int):
+    """Invalidate the movie's cached responses when `db` commits.
+
+    Flushed Movie, Comment and Rating objects are picked up automatically; call this for
+    writes that bypass the unit of work, such as Core UPDATE statements.
+    """
+    db.info.setdefault(_PENDING, set()).add(movie_id)
+
+
+def _touched_movies(obj):
+    if isinstance(obj, models.Movie):
+        return [obj.id]
+    if isinstance(obj, (models.Comment, models.Rating)):
+        # Include the old movie_id too if the row was moved to another movie.
+        history = inspect(obj).attrs.movie_id.history
+        return [obj.movie_id, *history.deleted]
+    return []
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_touched_movies(session, flush_context):
+    for obj in chain(session.new, session.dirty, session.deleted):
+        for movie_id in _touched_movies(obj):
+            if movie_id is not None:
+                mark_movie(session, movie_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_touched_movies(session):
+    for movie_id in session.info.pop(_PENDING, ()):
+        invalidate(movie_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_touched_movies(session):
+    session.info.pop(_PENDING, None)
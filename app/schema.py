@@ -1,4 +1,4 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional
 
 class UserBase(BaseModel):
@@ -15,6 +15,13 @@ class User(UserBase):
     ratings: Optional[List['Rating']] = []
     
     
+    model_config= ConfigDict(from_attributes=True)
+
+class UserIdentity(UserBase):
+    """Who is making the request: what auth caches instead of the full ORM user."""
+    id: int
+    email: Optional[str] = None
+
     model_config= ConfigDict(from_attributes=True)
 
 class Token(BaseModel):
@@ -31,15 +38,49 @@ class MovieBase(BaseModel):
 class MovieCreate(MovieBase):
     pass
 
-class Movie(MovieBase):
+class MovieRecord(MovieBase):
+    """The movie row itself, as returned by writes: no comment or rating lists."""
     id: int
     user_id: int
+    rating_count: int = 0
+    rating_avg: Optional[float] = None
+
+    model_config= ConfigDict(from_attributes=True)
+
+class Movie(MovieRecord):
     comments: Optional[List['Comment']] = []
     ratings: Optional[List['Rating']] = []
     
     
     model_config= ConfigDict(from_attributes=True)
     
+# Most ids one batch lookup may ask for, via GET ?ids= or the POST body.
+MAX_BATCH_IDS = 500
+
+class MovieBatchRequest(BaseModel):
+    ids: List[int] = Field(..., max_length=MAX_BATCH_IDS)
+
+class MovieBatch(BaseModel):
+    movies: List[Movie]
+    missing: List[int]
+
+class MovieRank(BaseModel):
+    id: int
+    title: str
+    rating_count: int
+    rating_avg: Optional[float] = None
+    score: float
+
+class MovieSummary(BaseModel):
+    """Compact movie card: no description and no comment or rating lists."""
+    id: int
+    title: str
+    user_id: Optional[int] = None
+    rating_count: int = 0
+    rating_avg: Optional[float] = None
+
+    model_config= ConfigDict(from_attributes=True)
+
 class MovieUpdate(MovieBase):
     pass
 
@@ -73,7 +114,19 @@ class Rating(RatingBase):
     user_id: int
     
     model_config= ConfigDict(from_attributes=True)
+
+class RatingBulkItem(BaseModel):
+    movie_id: int
+    score: float
+
+class RatingBulkRequest(BaseModel):
+    ratings: List[RatingBulkItem] = Field(..., min_length=1, max_length=10000)
+
+class RatingBulkResult(BaseModel):
+    created: int
+    ids: List[int]
     
 # Handle forward references for self-referencing models
 Movie.model_rebuild()
+MovieBatch.model_rebuild()
 Comment.model_rebuild()
\ No newline at end of file
@@ -0,0 +1,88 @@
+import re
+
+from sqlalchemy import DDL, column, event, func, literal_column, or_, select, table
+
+from app import models
+
+# SQLite: an external-content FTS5 table over movies, kept in sync by triggers.
+FTS_TABLE = "movies_fts"
+
+SQLITE_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS movies_fts USING fts5("
+    "title, description, content='movies', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS movies_fts_ai AFTER INSERT ON movies BEGIN "
+    "INSERT INTO movies_fts(rowid, title, description) VALUES (new.id, new.title, new.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS movies_fts_ad AFTER DELETE ON movies BEGIN "
+    "INSERT INTO movies_fts(movies_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS movies_fts_au AFTER UPDATE OF title, description ON movies BEGIN "
+    "INSERT INTO movies_fts(movies_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO movies_fts(rowid, title, description) VALUES (new.id, new.title, new.description); "
+    "END",
+    "INSERT INTO movies_fts(movies_fts) VALUES ('rebuild')",
+]
+
+# Postgres: an expression GIN index. The planner only uses it when the query repeats
+# the exact same expression, so both are built from POSTGRES_DOCUMENT.
+POSTGRES_DOCUMENT = "to_tsvector('english'::regconfig, title || ' ' || description)"
+
+POSTGRES_FTS_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_movies_search ON movies USING GIN ({POSTGRES_DOCUMENT})",
+]
+
+for statement in SQLITE_FTS_DDL:
+    event.listen(models.Movie.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+for statement in POSTGRES_FTS_DDL:
+    event.listen(models.Movie.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+event.listen(
+    models.Movie.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS movies_fts").execute_if(dialect="sqlite"),
+)
+
+movies_fts = table(FTS_TABLE, column("rowid"), column("rank"))
+
+
+def _fts5_match(q: str) -> str:
+    """Quote each word so user input can't inject FTS5 syntax; the last word matches as a prefix."""
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        return ""
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def movie_search_statement(dialect: str, q: str, limit: int):
+    """Build the ranked full-text query for the given dialect, or None if `q` has no words."""
+    if dialect == "sqlite":
+        match = _fts5_match(q)
+        if not match:
+            return None
+        return (
+            select(models.Movie)
+            .join(movies_fts, movies_fts.c.rowid == models.Movie.id)
+            .where(literal_column(FTS_TABLE).op("MATCH")(match))
+            .order_by(movies_fts.c.rank)
+            .limit(limit)
+        )
+    if dialect == "postgresql":
+        document = literal_column(POSTGRES_DOCUMENT)
+        query = func.websearch_to_tsquery(literal_column("'english'::regconfig"), q)
+        return (
+            select(models.Movie)
+            .where(document.op("@@")(query))
+            .order_by(func.ts_rank(document, query).desc(), models.Movie.id)
+            .limit(limit)
+        )
+    # No full-text index on other backends; fall back to a plain substring match.
+    pattern = f"%{q}%"
+    return (
+        select(models.Movie)
+        .where(or_(models.Movie.title.ilike(pattern), models.Movie.description.ilike(pattern)))
+        .order_by(models.Movie.id)
+        .limit(limit)
+    )
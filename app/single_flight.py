@@ -0,0 +1,75 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from app import metrics
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesce concurrent identical async calls into one.
+
+    The first caller for a key starts the work as its own task; callers arriving while it
+    runs await the same task instead of repeating it. Nothing is kept once it finishes, so
+    this only de-duplicates overlapping calls; caching is left to the caller.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.leaders = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        _groups.append(self)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        # Shield so a caller that disconnects doesn't cancel the work others are waiting on.
+        return await asyncio.shield(task)
+
+    def refresh(self, key: Hashable, fn: Callable[[], Awaitable[T]]):
+        """Run `fn` in the background, unless a call for `key` is already doing the work."""
+        if key in self._in_flight:
+            return
+        self.refreshes += 1
+        task = asyncio.ensure_future(self.do(key, fn))
+        _background.add(task)
+        task.add_done_callback(_background_done)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+
+    def stats(self) -> dict:
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "refreshes": self.refreshes,
+            "in_flight": len(self._in_flight),
+        }
+
+
+_groups = []
+# Background refreshes nobody awaits; held here so they aren't garbage collected mid-flight.
+_background = set()
+
+
+def _background_done(task: asyncio.Task):
+    _background.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background refresh failed: {task.exception()!r}")
+
+
+metrics.register("single_flight", lambda: {group.name: group.stats() for group in _groups})
+
+movie_reads = SingleFlight("movie_reads")
@@ -0,0 +1,224 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker
+
+from app import crud, database, lanes, metrics, schema
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Opt-in group commit: rating and comment inserts are queued and committed in shared transactions,
+# so N concurrent writes cost one commit (one fsync on SQLite) instead of N.
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "false").lower() in ("1", "true", "yes", "on")
+# A batch is committed once it holds this many rows or its first row has waited this long.
+# Each waiting request holds a write lane slot (and its worker thread), so one process never
+# has more than LANE_WRITE_LIMIT rows queued: a full lane closes the batch without waiting.
+WRITE_BEHIND_MAX_ROWS = int(os.getenv("WRITE_BEHIND_MAX_ROWS", lanes.LANE_WRITE_LIMIT))
+WRITE_BEHIND_MAX_DELAY_MS = float(os.getenv("WRITE_BEHIND_MAX_DELAY_MS", 5))
+# How long a request waits for its batch to start committing before giving up with a 503.
+WRITE_BEHIND_TIMEOUT = float(os.getenv("WRITE_BEHIND_TIMEOUT", 30))
+# PRAGMA synchronous for the batch commits on SQLite; defaults to SQLITE_SYNCHRONOUS. FULL fsyncs every
+# batch, OFF hands durability to the OS. On Postgres, OFF sets synchronous_commit=off for the batches.
+WRITE_BEHIND_DURABILITY = (os.getenv("WRITE_BEHIND_DURABILITY") or database.SQLITE_PRAGMAS["synchronous"]).upper()
+
+if WRITE_BEHIND_DURABILITY not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+    raise ValueError(f"Invalid WRITE_BEHIND_DURABILITY: {WRITE_BEHIND_DURABILITY!r}")
+
+
+class WriteBehindTimeout(Exception):
+    """The write waited WRITE_BEHIND_TIMEOUT without reaching a batch and was dropped, not stored."""
+
+
+class _Write(NamedTuple):
+    kind: str  # "rating" or "comment"
+    row: dict
+    future: Future
+
+
+_STOP = object()
+
+
+def _durability_listener(url):
+    backend = make_url(url).get_backend_name()
+
+    def apply_durability(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if backend == "sqlite":
+            cursor.execute(f"PRAGMA synchronous={WRITE_BEHIND_DURABILITY}")
+        elif backend == "postgresql" and WRITE_BEHIND_DURABILITY == "OFF":
+            cursor.execute("SET synchronous_commit = off")
+        cursor.close()
+
+    return apply_durability
+
+
+def make_session_factory(url: str = database.SQLALCHEMY_DATABASE_URL) -> sessionmaker:
+    """Sessions on an engine of their own, so the durability setting never leaks into request connections."""
+    flush_engine = database.make_engine(url)
+    # Registered after make_engine's pragmas, so it overrides their synchronous level.
+    event.listen(flush_engine, "connect", _durability_listener(url))
+    return sessionmaker(bind=flush_engine, autoflush=False)
+
+
+class WriteBehind:
+    """Queue of pending inserts drained by one flusher thread.
+
+    Each batch is a single transaction: ratings and comments go in with one executemany INSERT ...
+    RETURNING each, aggregates and versions are updated once per movie, and every waiting caller gets
+    its own row back when the commit lands. If a batch fails, its rows are retried one per
+    transaction so a bad row only fails its own caller.
+    """
+
+    def __init__(self, max_rows: int = WRITE_BEHIND_MAX_ROWS, max_delay_ms: float = WRITE_BEHIND_MAX_DELAY_MS, session_factory: Optional[sessionmaker] = None):
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000
+        self._session_factory = session_factory
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "cancelled": 0, "batches": 0, "rows": 0, "commits": 0, "retried_batches": 0, "failed": 0, "largest_batch": 0}
+
+    def submit(self, kind: str, row: dict) -> Future:
+        future: Future = Future()
+        with self._lock:
+            if self._thread is None:
+                if self._session_factory is None:
+                    self._session_factory = make_session_factory()
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+            self._stats["submitted"] += 1
+            self._queue.put(_Write(kind, row, future))
+        return future
+
+    def shutdown(self):
+        """Commit everything already queued and stop the flusher; the next submit starts a new one."""
+        # Held throughout, so a new flusher can't start and take the old one's stop marker.
+        with self._lock:
+            if self._thread is not None:
+                self._queue.put(_STOP)
+                self._thread.join()
+                self._thread = None
+
+    def stats(self) -> dict:
+        return dict(self._stats, pending=self._queue.qsize(), max_rows=self.max_rows, durability=WRITE_BEHIND_DURABILITY)
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch, stopping = [first], False
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_rows:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+            if stopping:
+                return
+
+    def _flush(self, batch: List[_Write]):
+        # Callers that gave up waiting cancelled their futures; those rows are never written.
+        # Marking the rest running means their callers now wait for the outcome instead.
+        live = [item for item in batch if item.future.set_running_or_notify_cancel()]
+        self._stats["cancelled"] += len(batch) - len(live)
+        batch = live
+        if not batch:
+            return
+        self._stats["batches"] += 1
+        self._stats["rows"] += len(batch)
+        self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+        try:
+            results = self._commit(batch)
+        except Exception as exc:
+            if len(batch) == 1:
+                self._fail(batch[0], exc)
+                return
+            logger.warning(f"Write-behind batch of {len(batch)} failed ({exc}); retrying rows one by one.")
+            self._stats["retried_batches"] += 1
+            for item in batch:
+                try:
+                    item.future.set_result(self._commit([item])[0])
+                except Exception as item_exc:
+                    self._fail(item, item_exc)
+            return
+        for item, result in zip(batch, results):
+            item.future.set_result(result)
+
+    def _fail(self, item: _Write, exc: Exception):
+        self._stats["failed"] += 1
+        item.future.set_exception(exc)
+
+    def _commit(self, batch: List[_Write]) -> list:
+        ratings = [index for index, item in enumerate(batch) if item.kind == "rating"]
+        comments = [index for index, item in enumerate(batch) if item.kind == "comment"]
+        db: Session = self._session_factory()
+        try:
+            db_ratings, applied = crud.insert_ratings(db, [batch[index].row for index in ratings])
+            db_comments = crud.insert_comments(db, [batch[index].row for index in comments])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        self._stats["commits"] += 1
+        # Only movies the aggregate UPDATE found, as in crud.create_rating.
+        crud.record_rating_deltas(applied)
+        results = [None] * len(batch)
+        for index, row in zip(ratings + comments, list(db_ratings) + list(db_comments)):
+            results[index] = row
+        return results
+
+
+writer = WriteBehind()
+metrics.register("write_behind", lambda: dict(writer.stats(), enabled=WRITE_BEHIND))
+
+
+def _wait(db: Session, kind: str, row: dict):
+    # Don't hold the request's connection (or an SQLite read lock) while the batch commits.
+    db.rollback()
+    future = writer.submit(kind, row)
+    try:
+        return future.result(timeout=WRITE_BEHIND_TIMEOUT)
+    except TimeoutError:
+        if future.cancel():
+            # Still queued: it will be skipped, so the client can safely retry.
+            raise WriteBehindTimeout("Write not committed in time")
+        # Its batch is already committing; report the real outcome rather than guess.
+        return future.result()
+
+
+def create_rating(db: Session, rating: schema.RatingCreate, movie_id: int, user_id: int):
+    """crud.create_rating, or a place in the next group commit when WRITE_BEHIND is on."""
+    if not WRITE_BEHIND:
+        return crud.create_rating(db, rating, movie_id=movie_id, user_id=user_id)
+    return _wait(db, "rating", {"score": rating.score, "movie_id": movie_id, "user_id": user_id})
+
+
+def create_comment(db: Session, comment: schema.CommentCreate, movie_id: int, user_id: int):
+    """crud.create_comment, or a place in the next group commit when WRITE_BEHIND is on."""
+    if not WRITE_BEHIND:
+        return crud.create_comment(db, comment, movie_id=movie_id, user_id=user_id)
+    return _wait(db, "comment", {
+        "content": comment.content,
+        "movie_id": movie_id,
+        "user_id": user_id,
+        "parent_comment_id": comment.parent_comment_id,
+    })
+
+
+def shutdown():
+    writer.shutdown()
@@ -0,0 +1,104 @@
+"""Commits (and so fsyncs) per rating write, with and without write-behind.
+
+    python benchmarks/group_commit.py --writes 2000 --threads 16
+
+Runs against a throwaway SQLite file with synchronous=FULL, where every commit is an fsync of the
+WAL; concurrent writers in direct mode each commit on their own, in write-behind mode they share
+batches. Pass --synchronous NORMAL to compare under the production default.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--writes", type=int, default=2000)
+parser.add_argument("--threads", type=int, default=16)
+parser.add_argument("--movies", type=int, default=20)
+parser.add_argument("--synchronous", default="FULL")
+args = parser.parse_args()
+
+workdir = tempfile.mkdtemp(prefix="movies-bench-")
+os.environ.update({
+    "DB_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+    "SQLITE_SYNCHRONOUS": args.synchronous,
+    "WRITE_BEHIND_DURABILITY": args.synchronous,
+})
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+
+from app import crud, database, models, schema, write_behind  # noqa: E402
+
+commits = 0
+commit_lock = threading.Lock()
+
+
+@event.listens_for(Engine, "commit")
+def count_commit(conn):
+    global commits
+    with commit_lock:
+        commits += 1
+
+
+def setup():
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    try:
+        user = crud.create_user(db, schema.UserCreate(username="bench", password="benchpassword", email="bench@example.com"), "x")
+        movie_ids = [crud.create_movie(db, schema.MovieCreate(title=f"Movie {i}", description="Bench"), user.id).id for i in range(args.movies)]
+    finally:
+        db.close()
+    return user.id, movie_ids
+
+
+def rate(user_id, movie_id):
+    db = database.SessionLocal()
+    try:
+        write_behind.create_rating(db, schema.RatingCreate(score=3.0, movie_id=movie_id), movie_id=movie_id, user_id=user_id)
+    finally:
+        db.close()
+
+
+def run(label, user_id, movie_ids):
+    global commits
+    commits = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(lambda i: rate(user_id, movie_ids[i % len(movie_ids)]), range(args.writes)))
+    elapsed = time.perf_counter() - started
+    print(f"{label:<13} {args.writes:>7} {commits:>8} {commits / args.writes:>14.3f} {args.writes / elapsed:>11.0f}")
+
+
+def main():
+    user_id, movie_ids = setup()
+    print(f"SQLite synchronous={args.synchronous}, {args.threads} threads")
+    print(f"{'mode':<13} {'writes':>7} {'commits':>8} {'commits/write':>14} {'writes/sec':>11}")
+    write_behind.WRITE_BEHIND = False
+    run("direct", user_id, movie_ids)
+    write_behind.WRITE_BEHIND = True
+    run("write-behind", user_id, movie_ids)
+    write_behind.shutdown()
+    stats = write_behind.writer.stats()
+    print(f"write-behind batches: {stats['batches']}, largest {stats['largest_batch']} rows")
+
+    db = database.SessionLocal()
+    try:
+        total = db.query(models.Rating).count()
+    finally:
+        db.close()
+    assert total == 2 * args.writes, f"expected {2 * args.writes} ratings, found {total}"
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
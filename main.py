@@ -1,15 +1,19 @@
-from fastapi import Depends, FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session 
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.auth import authenticate_user, create_access_token, get_current_user
 import app.crud as crud, app.schema as schema
-from app.database import engine, Base, get_db, init_db
-from app.auth import pwd_context
+from app.database import engine, Base, ReadSessionLocal, get_async_db, get_db, init_db
+from app.auth import get_password_hash
 from typing import Optional, List
 from app.endpoints import users, ratings, comments, movies
 from app.models import User, Movie, Comment, Rating 
 # import sentry_sdk
 from app.logger import get_logger
+from app import fieldsets, hashing, lanes, leaderboard, metrics, query_counter, write_behind
 from typing import List
 
 logger = get_logger(__name__)
@@ -19,7 +23,38 @@ def init_db():
 
 init_db()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    lanes.configure_thread_pool()
+    db = ReadSessionLocal()
+    try:
+        leaderboard.board.rebuild(db)
+    finally:
+        db.close()
+    yield
+    write_behind.shutdown()
+    hashing.shutdown()
+
+app = FastAPI(lifespan=lifespan)
+
+@app.exception_handler(hashing.HashingBusy)
+async def hashing_busy_handler(request: Request, exc: hashing.HashingBusy):
+    return JSONResponse(status_code=503, content={"detail": "Server busy, try again shortly"}, headers={"Retry-After": "1"})
+
+@app.exception_handler(lanes.LaneBusy)
+async def lane_busy_handler(request: Request, exc: lanes.LaneBusy):
+    return JSONResponse(status_code=503, content={"detail": "Server busy, try again shortly"}, headers={"Retry-After": "1"})
+
+@app.exception_handler(write_behind.WriteBehindTimeout)
+async def write_behind_timeout_handler(request: Request, exc: write_behind.WriteBehindTimeout):
+    return JSONResponse(status_code=503, content={"detail": "Server busy, try again shortly"}, headers={"Retry-After": "1"})
+
+@app.middleware("http")
+async def count_queries(request: Request, call_next):
+    with query_counter.count_queries() as counter:
+        response = await call_next(request)
+    response.headers[query_counter.QUERY_COUNT_HEADER] = str(counter.count)
+    return response
 
 
 app.include_router(users.router, prefix="/users", tags=["users"])
@@ -33,18 +68,18 @@ def read_root():
 
 
 
-@app.post("/signup", response_model=schema.User)
+@app.post("/signup", response_model=schema.User, dependencies=[lanes.AUTH])
 def signup(user: schema.UserCreate, db: Session = Depends(get_db)):
     logger.info('Creating user...')
     db_user = crud.get_user_by_username(db, username=user.username)
-    hashed_password = pwd_context.hash(user.password)
     if db_user:
         logger.warning(f"User with {user.username} already exists.")
         raise HTTPException(status_code=400, detail="Username already registered")
+    hashed_password = get_password_hash(user.password)
     logger.info('User successfully created.')
     return crud.create_user(db=db, user=user, hashed_password=hashed_password)
 
-@app.post("/login")
+@app.post("/login", dependencies=[lanes.AUTH])
 def login(
     form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
 ):
@@ -61,25 +96,16 @@ def login(
     return {"access_token": access_token, "token_type": "bearer"}
 
 
-@app.get("/movies/")
-def get_movies(
-    db: Session = Depends(get_db),
-    movie_id= int
-):
-    movies = crud.get_movies(db,movie_id)
-    return movies
-
-@app.get("/movie/{movie_id}", response_model=schema.Movie)
-def get_movie(movie_id: int, db: Session = Depends(get_db)):
+@app.get("/movie/{movie_id}", response_model=schema.Movie, dependencies=[lanes.READ])
+async def get_movie(movie_id: int, fields: Optional[str] = None, include: Optional[str] = None, if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)):
     logger.info(f'Getting movie with ID: {movie_id}')
-    movie = crud.get_movie(db, movie_id)
-    if not movie:
-        logger.error(f'Movie with ID {movie_id} not found.')
-        raise HTTPException(status_code=404, detail="Movie not found")
-    logger.info(f'Movie with ID {movie_id} retrieved successfully.')
-    return movie
+    try:
+        fieldset = fieldsets.parse_movie_fieldset(fields, include)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return await movies.serve_movie(movie_id, fieldset, if_none_match, db)
 
-@app.post("/movies", response_model=schema.Movie)
+@app.post("/movies", response_model=schema.Movie, dependencies=[lanes.WRITE])
 def create_movie(
     payload: schema.MovieCreate,
     user: schema.User = Depends(get_current_user),
@@ -88,7 +114,7 @@ def create_movie(
     movie = crud.create_movie(db, payload, user_id=user.id)
     return {"message": "success", "data": movie}
 
-@app.put("/movies/{movie_id}", response_model=schema.Movie)
+@app.put("/movies/{movie_id}", response_model=schema.Movie, dependencies=[lanes.WRITE])
 def update_movie(
     movie_id: int, payload: schema.MovieUpdate, db: Session = Depends(get_db), user: schema.User = Depends(get_current_user)
 ):
@@ -97,7 +123,7 @@ def update_movie(
         raise HTTPException(status_code=404, detail="Movie not found")
     return {"message": "success", "data": movie}
 
-@app.delete("/movies/{movie_id}", response_model=schema.Movie)
+@app.delete("/movies/{movie_id}", response_model=schema.Movie, dependencies=[lanes.WRITE])
 def delete_movie(
     movie_id: int, db: Session = Depends(get_db), user: schema.User = Depends(get_current_user)
 ):
@@ -106,56 +132,60 @@ def delete_movie(
         raise HTTPException(status_code=404, detail="Movie not found")
     return {"message": "success", "data": movie}
 
-@app.post("/movies/{movie_id}/ratings", response_model=schema.Rating)
+@app.post("/movies/{movie_id}/ratings", response_model=schema.Rating, dependencies=[lanes.WRITE])
 def create_rating(
     movie_id: int, 
     rating: schema.RatingCreate,
     db: Session = Depends(get_db),
     user: schema.User = Depends(get_current_user)
 ):
-    db_rating = crud.create_rating(db, rating, movie_id=movie_id, user_id=user.id)
+    if not crud.movie_exists(db, movie_id):
+        raise HTTPException(status_code=404, detail="Movie not found")
+    db_rating = write_behind.create_rating(db, rating, movie_id=movie_id, user_id=user.id)
     return db_rating
 
 
-@app.get("/movies/{movie_id}/ratings", response_model=List[schema.Rating])
-def get_ratings(movie_id: int, db: Session = Depends(get_db)):
-    ratings = crud.get_ratings(db, movie_id)
-    return ratings
+@app.get("/movies/{movie_id}/ratings", response_model=List[schema.Rating], dependencies=[lanes.READ])
+async def get_ratings(movie_id: int, if_none_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_async_db)):
+    return await ratings.serve_ratings(movie_id, if_none_match, db)
 
-@app.post("/movies/{movie_id}/comments", response_model=schema.Comment)
+@app.post("/movies/{movie_id}/comments", response_model=schema.Comment, dependencies=[lanes.WRITE])
 def create_comment(
     movie_id: int,
     comment: schema.CommentCreate,
     db: Session = Depends(get_db),
     user: schema.User = Depends(get_current_user)
 ):
-    db_comment = crud.create_comment(db, comment, movie_id=movie_id, user_id=user.id)
+    if not crud.movie_exists(db, movie_id):
+        raise HTTPException(status_code=404, detail="Movie not found")
+    db_comment = write_behind.create_comment(db, comment, movie_id=movie_id, user_id=user.id)
     return db_comment
 
-@app.get("/movies/{movie_id}/comments", response_model=List[schema.Comment])
-def get_comments(
+@app.get("/movies/{movie_id}/comments", response_model=List[schema.Comment], dependencies=[lanes.READ])
+async def get_comments(
     movie_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     skip: int = 0,
-    limit: int = 10
+    limit: int = Query(10, ge=1, le=100),
+    after: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
 ):
-    comments = crud.get_comments(db, movie_id, skip=skip, limit=limit)
-    return comments
+    return await comments.serve_comments(movie_id, skip, limit, after, if_none_match, db)
 
-@app.post("/comments/{parent_comment_id}/replies", response_model=schema.Comment)
+@app.post("/comments/{parent_comment_id}/replies", response_model=schema.Comment, dependencies=[lanes.WRITE])
 def create_nested_comment(
     parent_comment_id: int,
     comment: schema.CommentCreate,
     db: Session = Depends(get_db),
     user: schema.User = Depends(get_current_user)
 ):
-    parent_comment = crud.get_comment(db, parent_comment_id)
+    parent_comment = crud.get_comment_movie(db, parent_comment_id)
     if not parent_comment:
         raise HTTPException(status_code=404, detail="Parent comment not found")
     
-    db_comment = crud.create_comment(
+    db_comment = write_behind.create_comment(
         db, 
-        comment, 
+        comment.model_copy(update={"parent_comment_id": parent_comment_id}), 
         movie_id=parent_comment.movie_id, 
         user_id=user.id
     )
@@ -165,3 +195,7 @@ def create_nested_comment(
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+def read_metrics():
+    return metrics.snapshot()
+
@@ -0,0 +1,25 @@
+# tests/conftest.py
+import os
+import shutil
+import tempfile
+
+from alembic import command
+from alembic.config import Config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DB_DIR = tempfile.mkdtemp(prefix="movies-tests-")
+
+
+def pytest_configure(config):
+    # Run against a throwaway database, never the committed ./app.db. This runs before any
+    # test module imports the app, so app.database and alembic/env.py both pick up DB_URL.
+    os.environ["DB_URL"] = f"sqlite:///{os.path.join(TEST_DB_DIR, 'app.db')}"
+    os.environ.pop("DB_READ_URL", None)
+    # Bring it to the latest schema (the app's create_all would not add new columns).
+    alembic_config = Config(os.path.join(ROOT, "alembic.ini"))
+    alembic_config.set_main_option("script_location", os.path.join(ROOT, "alembic"))
+    command.upgrade(alembic_config, "head")
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(TEST_DB_DIR, ignore_errors=True)
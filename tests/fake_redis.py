@@ -0,0 +1,110 @@
+# tests/fake_redis.py
+"""A pure-Python server speaking enough of the Redis protocol for RedisCacheBackend.
+
+Start it on a free port and point the backend at `server.url`; tests then exercise the real
+client code over a real socket without needing a Redis install.
+"""
+
+import fnmatch
+import socketserver
+import threading
+import time
+
+
+class FakeRedisStore:
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+        self.commands = 0
+
+    def _alive(self, key):
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and expires <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def execute(self, command, args):
+        with self.lock:
+            self.commands += 1
+            if command in (b"PING",):
+                return b"+PONG"
+            if command in (b"AUTH", b"SELECT"):
+                return b"+OK"
+            if command == b"GET":
+                return self._alive(args[0])
+            if command == b"SET":
+                key, value, options = args[0], args[1], [arg.upper() for arg in args[2:]]
+                expires = None
+                if b"PX" in options:
+                    expires = time.monotonic() + int(args[2 + options.index(b"PX") + 1]) / 1000
+                if b"EX" in options:
+                    expires = time.monotonic() + int(args[2 + options.index(b"EX") + 1])
+                if b"NX" in options and self._alive(key) is not None:
+                    return None
+                self.data[key] = (value, expires)
+                return b"+OK"
+            if command == b"DEL":
+                return sum(1 for key in args if self.data.pop(key, None) is not None)
+            if command == b"SCAN":
+                pattern = args[args.index(b"MATCH") + 1].decode() if b"MATCH" in args else "*"
+                keys = [key for key in list(self.data) if self._alive(key) is not None and fnmatch.fnmatchcase(key.decode(), pattern)]
+                return [b"0", keys]
+            if command == b"FLUSHDB":
+                self.data.clear()
+                return b"+OK"
+            return Exception(f"ERR unknown command '{command.decode()}'")
+
+
+def _encode(reply) -> bytes:
+    if reply is None:
+        return b"$-1\r\n"
+    if isinstance(reply, Exception):
+        return b"-" + str(reply).encode() + b"\r\n"
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    if isinstance(reply, list):
+        return b"*%d\r\n" % len(reply) + b"".join(_encode(item) for item in reply)
+    if reply.startswith(b"+"):
+        return reply + b"\r\n"
+    return b"$%d\r\n%s\r\n" % (len(reply), reply)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            count = int(line[1:-2])
+            args = []
+            for _ in range(count):
+                length = int(self.rfile.readline()[1:-2])
+                args.append(self.rfile.read(length + 2)[:-2])
+            reply = self.server.store.execute(args[0].upper(), args[1:])
+            self.wfile.write(_encode(reply))
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), _Handler)
+        self.store = FakeRedisStore()
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return f"redis://{host}:{port}/0"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
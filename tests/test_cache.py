@@ -0,0 +1,158 @@
+# tests/test_cache.py
+
+import asyncio
+import socket
+import time
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from main import app
+from app import crud, response_cache, schema
+from app.database import SQLALCHEMY_DATABASE_URL
+from app.cache_backends import LocalCacheBackend, RedisCacheBackend, RedisError, make_backend
+from tests.fake_redis import FakeRedisServer
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture(scope="module")
+def fake_redis():
+    server = FakeRedisServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(request, fake_redis):
+    if request.param == "memory":
+        return LocalCacheBackend(max_bytes=1024)
+    backend = RedisCacheBackend(fake_redis.url, prefix="test:")
+    backend.clear()
+    return backend
+
+
+def test_backend_contract(backend):
+    assert backend.get("missing") is None
+    backend.set("key", b"value")
+    assert backend.get("key") == b"value"
+
+    assert backend.add("key", b"other") is False
+    assert backend.add("fresh", b"first") is True
+    assert backend.get("fresh") == b"first"
+
+    backend.set("short", b"lived", ttl=0.05)
+    time.sleep(0.1)
+    assert backend.get("short") is None
+
+    backend.delete("key")
+    assert backend.get("key") is None
+    backend.clear()
+    assert backend.get("fresh") is None
+
+
+def test_local_backend_is_bounded_by_bytes():
+    backend = LocalCacheBackend(max_bytes=10)
+    backend.set("a", b"12345")
+    backend.set("b", b"12345")
+    backend.get("a")
+    backend.set("c", b"12345")
+    assert backend.get("b") is None
+    assert backend.get("a") == b"12345"
+    assert backend.stats()["bytes"] == 10
+
+
+def test_redis_backend_fails_open():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    backend = RedisCacheBackend(f"redis://127.0.0.1:{port}/0")
+    assert backend.get("key") is None
+    backend.set("key", b"value")
+    assert backend.add("key", b"value") is False
+    assert backend.stats()["errors"] >= 3
+
+
+def test_redis_backend_retries_a_dead_pooled_connection(fake_redis):
+    backend = RedisCacheBackend(fake_redis.url, prefix="test:")
+    backend.set("key", b"value")
+    # As after a server restart: the idle connection's socket is gone.
+    pooled = backend._idle.get_nowait()
+    pooled.sock.shutdown(socket.SHUT_RDWR)
+    backend._idle.put_nowait(pooled)
+    assert backend.get("key") == b"value"
+    assert backend.stats()["errors"] == 0
+    assert backend._idle.qsize() == 1 and backend._idle.get_nowait() is not pooled
+
+
+def test_redis_error_reply_keeps_the_connection(fake_redis):
+    backend = RedisCacheBackend(fake_redis.url, prefix="test:")
+    backend.set("key", b"value")
+    pooled = backend._idle.get_nowait()
+    backend._idle.put_nowait(pooled)
+    with pytest.raises(RedisError):
+        backend._execute("BOGUS")
+    assert backend.stats()["errors"] == 1
+    assert backend.get("key") == b"value"
+    assert backend._idle.get_nowait() is pooled
+
+
+def test_make_backend_from_url(fake_redis):
+    assert isinstance(make_backend("memory://"), LocalCacheBackend)
+    assert isinstance(make_backend(fake_redis.url), RedisCacheBackend)
+    with pytest.raises(ValueError):
+        make_backend("memcached://localhost")
+
+
+def test_response_cache_shared_through_redis(fake_redis, monkeypatch):
+    monkeypatch.setattr(response_cache, "backend", RedisCacheBackend(fake_redis.url, prefix="shared:"))
+    db = TestingSessionLocal()
+    try:
+        user = crud.get_user_by_username(db, "cache_user") or crud.create_user(
+            db, schema.UserCreate(username="cache_user", email="cache@example.com", password="unused"), ""
+        )
+        movie = crud.create_movie(db, schema.MovieCreate(title="Heat", description="Cops and robbers"), user_id=user.id)
+        movie_id, user_id = movie.id, user.id
+    finally:
+        db.close()
+
+    client = TestClient(app)
+    first = client.get(f"/movies/{movie_id}")
+    assert first.status_code == 200
+    # Another worker pointed at the same Redis gets the stored bytes without touching the database.
+    monkeypatch.setattr(response_cache, "backend", RedisCacheBackend(fake_redis.url, prefix="shared:"))
+    second = client.get(f"/movies/{movie_id}")
+    assert second.headers["X-Query-Count"] == "0"
+    assert second.content == first.content
+
+    db = TestingSessionLocal()
+    try:
+        crud.update_movie(db, movie_id, schema.MovieUpdate(title="Heat", description="Director's cut"), user_id=user_id)
+    finally:
+        db.close()
+    assert client.get(f"/movies/{movie_id}").json()["description"] == "Director's cut"
+
+
+def test_generation_keys_expire(fake_redis, monkeypatch):
+    monkeypatch.setattr(response_cache, "backend", RedisCacheBackend(fake_redis.url, prefix="gen-ttl:"))
+    asyncio.run(response_cache.lookup(424242, ("movie", None)))
+    response_cache.invalidate(434343)
+    for movie_id in (424242, 434343):
+        _, expires = fake_redis.store.data[f"gen-ttl:gen:{movie_id}".encode()]
+        assert expires is not None
+        assert expires - time.monotonic() <= response_cache.GENERATION_TTL
+
+
+def test_unreadable_generation_skips_the_store(monkeypatch):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    monkeypatch.setattr(response_cache, "backend", RedisCacheBackend(f"redis://127.0.0.1:{port}/0"))
+    before = response_cache._stats_snapshot()["stores"]
+
+    entry, generation = asyncio.run(response_cache.lookup(1, ("movie", None)))
+    assert entry is None and generation is None
+    stored = asyncio.run(response_cache.store(1, generation, ("movie", None), b"{}"))
+    assert stored.body == b"{}"
+    assert response_cache._stats_snapshot()["stores"] == before
@@ -5,11 +5,10 @@ from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from main import app
-from app.database import Base, get_db
+from app.database import SQLALCHEMY_DATABASE_URL, Base, get_db
 import logging
 
 # Setup test database
-SQLALCHEMY_DATABASE_URL = "sqlite:///./app.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -98,3 +97,40 @@ def test_create_and_read_comments(client, test_user, test_movie):
     
     # Check if the created comment is in the list
     assert any(comment["content"] == "This is a test comment" for comment in comments), "The created comment was not found in the list."
+
+
+def test_read_comment_thread(client, test_user, test_movie):
+    headers = {"Authorization": f"Bearer {test_user['access_token']}"}
+    root_id = client.post(f"/movies/{test_movie['id']}/comments", json={"content": "Root", "movie_id": test_movie['id']}, headers=headers).json()["id"]
+    parent = {"id": root_id}
+    for level in range(1, 4):
+        parent = client.post(f"/comments/{parent['id']}/replies", json={"content": f"Level {level}", "movie_id": test_movie['id']}, headers=headers).json()
+
+    response = client.get(f"/comments/{root_id}/thread", params={"max_depth": 2})
+    assert response.status_code == 200
+    root = response.json()
+    assert root["content"] == "Root"
+    assert root["replies"][0]["content"] == "Level 1"
+    assert root["replies"][0]["replies"][0]["content"] == "Level 2"
+    assert root["replies"][0]["replies"][0]["replies"] == []
+
+    assert client.get("/comments/999999/thread").status_code == 404
+
+
+def test_comment_and_reply_cursor_pagination(client, test_user, test_movie):
+    headers = {"Authorization": f"Bearer {test_user['access_token']}"}
+    root = client.post(f"/movies/{test_movie['id']}/comments", json={"content": "First", "movie_id": test_movie['id']}, headers=headers).json()
+    client.post(f"/movies/{test_movie['id']}/comments", json={"content": "Second", "movie_id": test_movie['id']}, headers=headers)
+    for i in range(2):
+        client.post(f"/comments/{root['id']}/replies", json={"content": f"Reply {i}", "movie_id": test_movie['id']}, headers=headers)
+
+    first_page = client.get(f"/movies/{test_movie['id']}/comments", params={"limit": 1})
+    assert [comment["content"] for comment in first_page.json()] == ["First"]
+    second_page = client.get(f"/movies/{test_movie['id']}/comments", params={"limit": 1, "after": first_page.headers["X-Next-Cursor"]})
+    assert [comment["content"] for comment in second_page.json()] == ["Second"]
+    assert "X-Next-Cursor" not in second_page.headers
+
+    replies = client.get(f"/comments/{root['id']}/replies", params={"limit": 1})
+    assert [reply["content"] for reply in replies.json()] == ["Reply 0"]
+    replies = client.get(f"/comments/{root['id']}/replies", params={"limit": 1, "after": replies.headers["X-Next-Cursor"]})
+    assert [reply["content"] for reply in replies.json()] == ["Reply 1"]
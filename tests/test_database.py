@@ -0,0 +1,41 @@
+# tests/test_database.py
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from app.database import SQLITE_PRAGMAS, engine, engine_options, is_sqlite, make_engine
+
+SYNCHRONOUS_LEVELS = {"OFF": 0, "NORMAL": 1, "FULL": 2, "EXTRA": 3}
+
+
+def test_sqlite_connections_use_production_pragmas():
+    if not is_sqlite(engine.url):
+        pytest.skip("DB_URL is not SQLite")
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar().lower() == SQLITE_PRAGMAS["journal_mode"].lower()
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == SQLITE_PRAGMAS["busy_timeout"]
+        assert conn.execute(text("PRAGMA cache_size")).scalar() == SQLITE_PRAGMAS["cache_size"]
+        # PRAGMA synchronous reports the level as a number.
+        configured = str(SQLITE_PRAGMAS["synchronous"]).upper()
+        expected = int(configured) if configured.isdigit() else SYNCHRONOUS_LEVELS[configured]
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == expected
+
+
+def test_engine_options_for_sqlite():
+    options = engine_options("sqlite:///./app.db")
+    assert options["connect_args"]["check_same_thread"] is False
+    assert "pool_size" in options
+    assert "pool_size" not in engine_options("sqlite://")
+
+
+def test_read_only_sqlite_engine_rejects_writes():
+    if not is_sqlite(engine.url):
+        pytest.skip("DB_URL is not SQLite")
+    read_engine = make_engine(f"sqlite:///file:{engine.url.database}?mode=ro&uri=true")
+    try:
+        with read_engine.connect() as conn:
+            assert conn.execute(text("SELECT COUNT(*) FROM movies")).scalar() >= 0
+            with pytest.raises(OperationalError):
+                conn.execute(text("UPDATE movies SET title = title"))
+    finally:
+        read_engine.dispose()
@@ -1,14 +1,17 @@
 # tests/test_movies.py
+import asyncio
+import httpx
 import pytest
 from fastapi.testclient import TestClient
 from main import app
-from app.database import Base, get_db
-from sqlalchemy import create_engine
+from app.database import SQLALCHEMY_DATABASE_URL, Base, get_db
+from app import async_crud, crud, models, response_cache, schema, single_flight
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker
 import logging
+import time
 
 # Create a new engine for testing
-SQLALCHEMY_DATABASE_URL = "sqlite:///./app.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -93,3 +96,297 @@ def test_delete_movie(client, create_movie, token):
     response = client.delete(f"/movies/{movie_id}", headers={"Authorization": f"Bearer {token}"})
     logger.info(f"Delete movie response: {response.status_code}")
     assert response.status_code == 200
+
+def test_list_movies_keyset_pagination(client, create_movie, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    client.post("/movies/", json={"title": "Tenet", "description": "Time runs backwards"}, headers=headers)
+
+    first_page = client.get("/movies/", params={"limit": 1})
+    assert first_page.status_code == 200
+    assert len(first_page.json()) == 1
+    cursor = first_page.headers["X-Next-Cursor"]
+
+    second_page = client.get("/movies/", params={"limit": 1, "after": cursor})
+    assert second_page.status_code == 200
+    assert second_page.json()[0]["id"] > first_page.json()[0]["id"]
+
+    response = client.get("/movies/", params={"after": "not-a-cursor"})
+    assert response.status_code == 400
+
+def test_search_movies(client, create_movie):
+    response = client.get("/movies/search", params={"q": "mind bend"})
+    assert response.status_code == 200
+    assert any(movie["title"].startswith("Inception") for movie in response.json())
+
+    response = client.get("/movies/search", params={"q": "xyzzy-no-such-movie"})
+    assert response.status_code == 200
+    assert response.json() == []
+
+def test_read_movies_batch(client, create_movie):
+    movie_id = create_movie["id"]
+    missing_id = movie_id + 100000
+
+    response = client.get("/movies/batch", params={"ids": f"{missing_id},{movie_id}"})
+    assert response.status_code == 200
+    body = response.json()
+    assert [movie["id"] for movie in body["movies"]] == [movie_id]
+    assert body["missing"] == [missing_id]
+
+    response = client.post("/movies/batch", json={"ids": [movie_id, missing_id]})
+    assert response.status_code == 200
+    assert response.json()["missing"] == [missing_id]
+
+    assert client.get("/movies/batch", params={"ids": "1,abc"}).status_code == 400
+
+def test_read_movie_query_count_is_fixed(client, create_movie, token):
+    movie_id = create_movie["id"]
+    headers = {"Authorization": f"Bearer {token}"}
+    baseline = client.get(f"/movies/{movie_id}")
+    assert baseline.status_code == 200
+
+    for i in range(3):
+        comment = client.post(f"/movies/{movie_id}/comments", json={"content": f"Comment {i}", "movie_id": movie_id}, headers=headers).json()
+        reply = client.post(f"/comments/{comment['id']}/replies", json={"content": f"Reply {i}", "movie_id": movie_id}, headers=headers).json()
+        client.post(f"/comments/{reply['id']}/replies", json={"content": f"Nested {i}", "movie_id": movie_id}, headers=headers)
+
+    response = client.get(f"/movies/{movie_id}")
+    assert response.status_code == 200
+    assert len(response.json()["comments"]) == 9
+    assert response.headers["X-Query-Count"] == baseline.headers["X-Query-Count"]
+
+def test_read_movie_sparse_fieldsets(client, create_movie):
+    movie_id = create_movie["id"]
+
+    response = client.get(f"/movies/{movie_id}", params={"fields": "title"})
+    assert response.status_code == 200
+    assert response.json() == {"id": movie_id, "title": "Inception"}
+
+    response = client.get(f"/movies/{movie_id}", params={"include": "ratings"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["ratings"] == []
+    assert "comments" not in body and "description" not in body
+    assert response.headers["X-Query-Count"] == "2"
+
+    response = client.get("/movies/", params={"fields": "title", "limit": 1})
+    assert response.status_code == 200
+    assert set(response.json()[0]) == {"id", "title"}
+
+    assert client.get(f"/movies/{movie_id}", params={"fields": "budget"}).status_code == 400
+
+def test_conditional_get_with_etags(client, create_movie, token):
+    movie_id = create_movie["id"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.get(f"/movies/{movie_id}")
+    etag = response.headers["ETag"]
+    cached = client.get(f"/movies/{movie_id}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+    assert cached.content == b""
+    assert int(cached.headers["X-Query-Count"]) <= 1
+
+    # A different representation never shares a tag.
+    sparse = client.get(f"/movies/{movie_id}", params={"fields": "title"})
+    assert sparse.headers["ETag"] != etag
+    assert client.get(f"/movies/{movie_id}", params={"fields": "title"}, headers={"If-None-Match": sparse.headers["ETag"]}).status_code == 304
+
+    comments = client.get(f"/comments/{movie_id}/")
+    ratings = client.get(f"/ratings/{movie_id}/")
+    assert client.get(f"/comments/{movie_id}/", headers={"If-None-Match": comments.headers["ETag"]}).status_code == 304
+    assert client.get(f"/ratings/{movie_id}/", headers={"If-None-Match": ratings.headers["ETag"]}).status_code == 304
+
+    # Any write to the movie, its comments or its ratings changes every tag.
+    client.post(f"/movies/{movie_id}/comments", json={"content": "New comment", "movie_id": movie_id}, headers=headers)
+    response = client.get(f"/movies/{movie_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert client.get(f"/comments/{movie_id}/", headers={"If-None-Match": comments.headers["ETag"]}).status_code == 200
+
+    etag = response.headers["ETag"]
+    assert client.post(f"/ratings/{movie_id}/", json={"score": 4.0, "movie_id": movie_id}, headers=headers).status_code == 200
+    assert client.get(f"/movies/{movie_id}", headers={"If-None-Match": etag}).status_code == 200
+    assert client.get(f"/ratings/{movie_id}/", headers={"If-None-Match": ratings.headers["ETag"]}).status_code == 200
+
+    etag = client.get(f"/movies/{movie_id}").headers["ETag"]
+    client.put(f"/movies/{movie_id}", json={"title": "Inception", "description": "Updated"}, headers=headers)
+    assert client.get(f"/movies/{movie_id}", headers={"If-None-Match": etag}).status_code == 200
+
+def test_both_url_shapes_share_cache_and_etags(client, create_movie):
+    movie_id = create_movie["id"]
+    pairs = [
+        (f"/movies/{movie_id}", f"/movie/{movie_id}"),
+        (f"/ratings/{movie_id}/", f"/movies/{movie_id}/ratings"),
+        (f"/comments/{movie_id}/", f"/movies/{movie_id}/comments"),
+    ]
+    for router_path, legacy_path in pairs:
+        first = client.get(router_path)
+        second = client.get(legacy_path)
+        assert first.status_code == second.status_code == 200
+        assert first.json() == second.json()
+        assert first.headers["ETag"] == second.headers["ETag"]
+        assert client.get(legacy_path, headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+def test_read_movie_response_cache(client, create_movie, token):
+    movie_id = create_movie["id"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    first = client.get(f"/movies/{movie_id}")
+    second = client.get(f"/movies/{movie_id}")
+    assert second.headers["X-Query-Count"] == "0"
+    assert second.content == first.content
+    assert second.headers["ETag"] == first.headers["ETag"]
+
+    # A matching If-None-Match on a cold cache costs only the version lookup.
+    response_cache.backend.clear()
+    response = client.get(f"/movies/{movie_id}", headers={"If-None-Match": first.headers["ETag"]})
+    assert response.status_code == 304
+    assert response.headers["X-Query-Count"] == "1"
+
+    client.get(f"/movies/{movie_id}/comments")
+    client.get(f"/ratings/{movie_id}/")
+    assert client.get(f"/movies/{movie_id}/comments").headers["X-Query-Count"] == "0"
+
+    # Committed writes drop every cached response for the movie, whichever route made them.
+    client.post(f"/movies/{movie_id}/comments", json={"content": "Fresh", "movie_id": movie_id}, headers=headers)
+    comments = client.get(f"/movies/{movie_id}/comments")
+    assert comments.headers["X-Query-Count"] != "0"
+    assert "Fresh" in [comment["content"] for comment in comments.json()]
+    assert len(client.get(f"/movies/{movie_id}").json()["comments"]) == 1
+
+    client.post(f"/ratings/{movie_id}/", json={"score": 3.0, "movie_id": movie_id}, headers=headers)
+    assert len(client.get(f"/ratings/{movie_id}/").json()) == 1
+    assert client.get(f"/movies/{movie_id}").json()["rating_count"] == 1
+
+    client.put(f"/movies/{movie_id}", json={"title": "Inception", "description": "Recut"}, headers=headers)
+    assert client.get(f"/movies/{movie_id}").json()["description"] == "Recut"
+
+def test_concurrent_movie_reads_are_coalesced(client, create_movie):
+    movie_id = create_movie["id"]
+    response_cache.backend.clear()
+    before = single_flight.movie_reads.stats()
+
+    async def burst():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            return await asyncio.gather(*(async_client.get(f"/movie/{movie_id}") for _ in range(20)))
+
+    responses = asyncio.run(burst())
+    assert {response.status_code for response in responses} == {200}
+    assert len({response.content for response in responses}) == 1
+
+    after = single_flight.movie_reads.stats()
+    assert after["leaders"] - before["leaders"] < 20
+    assert after["coalesced"] > before["coalesced"]
+    assert after["in_flight"] == 0
+    assert client.get("/metrics").json()["single_flight"]["movie_reads"]["coalesced"] == after["coalesced"]
+
+def test_reads_after_a_write_do_not_join_an_older_load(client, create_movie, token, monkeypatch):
+    movie_id = create_movie["id"]
+    response_cache.backend.clear()
+    release = asyncio.Event()
+    get_movie = async_crud.get_movie
+
+    async def held_get_movie(*args, **kwargs):
+        if not release.is_set():
+            await release.wait()
+        return await get_movie(*args, **kwargs)
+
+    monkeypatch.setattr(async_crud, "get_movie", held_get_movie)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            before_write = asyncio.ensure_future(async_client.get(f"/movie/{movie_id}"))
+            await asyncio.sleep(0.1)  # its load is now in flight, waiting on `release`
+            db = TestingSessionLocal()
+            try:
+                crud.update_movie(db, movie_id, schema.MovieUpdate(title="Inception", description="Recut"), user_id=create_movie["user_id"])
+            finally:
+                db.close()
+            after_write = asyncio.ensure_future(async_client.get(f"/movie/{movie_id}"))
+            await asyncio.sleep(0.1)
+            release.set()
+            return await before_write, await after_write
+
+    _, after_write = asyncio.run(scenario())
+    assert after_write.json()["description"] == "Recut"
+
+def test_missing_movie_lookups_are_cached(client):
+    missing_id = 987654
+    first = client.get(f"/movie/{missing_id}")
+    assert first.status_code == 404
+    second = client.get(f"/movie/{missing_id}")
+    assert second.status_code == 404
+    assert second.json() == {"detail": "Movie not found"}
+    assert second.headers["X-Query-Count"] == "0"
+
+    # Creating the movie invalidates the cached 404 straight away.
+    db = TestingSessionLocal()
+    try:
+        db.add(models.Movie(id=missing_id, title="Late arrival", description="Now it exists", user_id=1))
+        db.commit()
+        response = client.get(f"/movie/{missing_id}")
+        assert response.status_code == 200
+        assert response.json()["title"] == "Late arrival"
+        db.delete(db.get(models.Movie, missing_id))
+        db.commit()
+    finally:
+        db.close()
+
+def test_stale_movie_is_served_while_revalidating(client, create_movie, monkeypatch):
+    movie_id = create_movie["id"]
+    monkeypatch.setattr(response_cache, "RESPONSE_CACHE_TTL", 0)
+    response_cache.backend.clear()
+    assert client.get(f"/movie/{movie_id}").json()["description"] == "A mind-bending thriller"
+
+    # Written behind the ORM's back (as another worker would with a per-process cache).
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE movies SET description = 'Rewritten' WHERE id = :id"), {"id": movie_id})
+    before = client.get("/metrics").json()
+
+    stale = client.get(f"/movie/{movie_id}")
+    assert stale.status_code == 200
+    assert stale.json()["description"] == "A mind-bending thriller"
+
+    for _ in range(50):
+        if client.get(f"/movie/{movie_id}").json()["description"] == "Rewritten":
+            break
+        time.sleep(0.02)
+    else:
+        pytest.fail("stale entry was never refreshed")
+
+    after = client.get("/metrics").json()
+    assert after["response_cache"]["stale_hits"] > before["response_cache"]["stale_hits"]
+    assert after["single_flight"]["movie_reads"]["refreshes"] > before["single_flight"]["movie_reads"]["refreshes"]
+
+
+def test_movie_writes_do_not_reselect_the_row(client, create_movie, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        created = client.post("/movies/", json={"title": "Returning", "description": "One trip"}, headers=headers)
+        updated = client.put(f"/movies/{created.json()['id']}", json={"title": "Returning 2", "description": "Still one"}, headers=headers)
+        deleted = client.delete(f"/movies/{created.json()['id']}", headers=headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    assert created.status_code == updated.status_code == deleted.status_code == 200
+    assert updated.json()["title"] == "Returning 2"
+    assert deleted.json()["id"] == created.json()["id"]
+    assert "comments" not in updated.json()
+    assert not [sql for sql in statements if sql.lstrip().upper().startswith("SELECT") and "FROM movies" in sql]
+
+    assert client.put(f"/movies/{created.json()['id']}", json={"title": "t", "description": "d"}, headers=headers).status_code == 404
+
+    client.post("/users/", json={"username": "not_the_owner", "password": "otherpassword", "email": "other@example.com"})
+    other = client.post("/login", data={"username": "not_the_owner", "password": "otherpassword"}).json()["access_token"]
+    other_headers = {"Authorization": f"Bearer {other}"}
+    assert client.put(f"/movies/{create_movie['id']}", json={"title": "t", "description": "d"}, headers=other_headers).status_code == 403
+    assert client.delete(f"/movies/{create_movie['id']}", headers=other_headers).status_code == 403
+    assert client.get(f"/movies/{create_movie['id']}").json()["title"] == "Inception"
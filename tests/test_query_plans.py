@@ -0,0 +1,74 @@
+# tests/test_query_plans.py
+
+import re
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from app import crud, schema
+from app.database import SQLALCHEMY_DATABASE_URL
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Plans are checked against the migrated app database so missing indexes show up here.
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# "SCAN <table>" on a real table means every row (or index entry) is visited.
+FULL_SCAN = re.compile(r"\bSCAN (TABLE )?(users|movies|comments|ratings)\b")
+
+CRUD_QUERIES = {
+    "get_user": lambda db: crud.get_user(db, 1),
+    "get_user_by_username": lambda db: crud.get_user_by_username(db, "testuser"),
+    "get_movie": lambda db: crud.get_movie(db, 1),
+    "movie_exists": lambda db: crud.movie_exists(db, 1),
+    "get_existing_movie_ids": lambda db: crud.get_existing_movie_ids(db, [1, 2, 3]),
+    "comment_exists": lambda db: crud.comment_exists(db, 1),
+    "get_comment_movie": lambda db: crud.get_comment_movie(db, 1),
+    "get_movie_version": lambda db: crud.get_movie_version(db, 1),
+    "bump_movie_version": lambda db: crud.bump_movie_version(db, 1),
+    "bump_movie_versions": lambda db: crud.bump_movie_versions(db, [1, 2, 3]),
+    "get_movies_by_id": lambda db: crud.get_movies(db, movie_id=1),
+    "get_movies_page": lambda db: crud.get_movies(db, after=1, limit=20),
+    "get_movies_by_ids": lambda db: crud.get_movies_by_ids(db, [1, 2, 3]),
+    "search_movies": lambda db: crud.search_movies(db, "inception"),
+    "update_movie": lambda db: crud.update_movie(db, 1, schema.MovieUpdate(title="t", description="d"), user_id=-1),
+    "delete_movie": lambda db: crud.delete_movie(db, 1, user_id=-1),
+    "get_comments": lambda db: crud.get_comments(db, 1, after=1),
+    "get_comment_replies": lambda db: crud.get_comment_replies(db, 1, after=1),
+    "get_comment_thread": lambda db: crud.get_comment_thread(db, 1, max_depth=5),
+    "get_ratings": lambda db: crud.get_ratings(db, 1),
+    "apply_rating_delta": lambda db: crud.apply_rating_delta(db, 1, 0, 0.0),
+}
+
+
+def capture_statements(fn):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    db = TestingSessionLocal()
+    try:
+        fn(db)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+        db.rollback()
+        db.close()
+    return statements
+
+
+@pytest.mark.parametrize("name", sorted(CRUD_QUERIES))
+def test_crud_queries_use_indexes(name):
+    statements = capture_statements(CRUD_QUERIES[name])
+    assert statements, f"{name} ran no SQL"
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            plan = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+            logger.info(f"{name}: {plan}")
+            scans = [step for step in plan if FULL_SCAN.search(step)]
+            assert not scans, f"{name} does a full table scan {scans} in:\n{statement}"
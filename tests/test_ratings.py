@@ -1,15 +1,20 @@
 # tests/test_ratings.py
 
+import asyncio
+import random
+import threading
+import time
+import httpx
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from main import app
-from app.database import Base, get_db
+from app.database import SQLALCHEMY_DATABASE_URL, Base, get_db
+from app import lanes, leaderboard, write_behind
 import logging
 
 # Setup test database
-SQLALCHEMY_DATABASE_URL = "sqlite:///./app.db"  # Use a separate test database
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -86,3 +91,241 @@ def test_create_and_read_ratings(client, test_user, test_movie):
     assert isinstance(ratings, list)
     assert len(ratings) > 0  # Ensure that the list is not empty
     assert ratings[0]["score"] == 5.0  # Check if the rating is as expected
+
+def test_rating_updates_movie_aggregates(client, test_user, test_movie):
+    headers = {"Authorization": f"Bearer {test_user['access_token']}"}
+    for score in (4.0, 2.0):
+        response = client.post(f"/movies/{test_movie['id']}/ratings", json={"score": score, "movie_id": test_movie['id']}, headers=headers)
+        assert response.status_code == 200
+
+    movie = client.get(f"/movies/{test_movie['id']}").json()
+    assert movie["rating_count"] == 2
+    assert movie["rating_avg"] == 3.0
+
+def test_top_movies(client, test_user, test_movie):
+    headers = {"Authorization": f"Bearer {test_user['access_token']}"}
+    client.post(f"/movies/{test_movie['id']}/ratings", json={"score": 10.0, "movie_id": test_movie['id']}, headers=headers)
+
+    for by in ("avg", "count", "bayesian"):
+        response = client.get("/movies/top", params={"by": by, "limit": 5})
+        assert response.status_code == 200
+        scores = [movie["score"] for movie in response.json()]
+        assert scores == sorted(scores, reverse=True)
+
+    top = client.get("/movies/top", params={"by": "avg", "limit": 100}).json()
+    assert any(movie["id"] == test_movie["id"] for movie in top)
+
+    response = client.get("/movies/top", params={"by": "median"})
+    assert response.status_code == 422
+
+def test_rating_cost_does_not_depend_on_comment_count(client, test_user, test_movie):
+    headers = {"Authorization": f"Bearer {test_user['access_token']}"}
+    busy_movie = client.post("/movies/", json={"title": "Busy Movie", "description": "Lots to say"}, headers=headers).json()
+    for i in range(30):
+        client.post(f"/movies/{busy_movie['id']}/comments", json={"content": f"Comment {i}", "movie_id": busy_movie['id']}, headers=headers)
+
+    counts = []
+    for movie in (test_movie, busy_movie):
+        for path in (f"/ratings/{movie['id']}/", f"/movies/{movie['id']}/ratings"):
+            response = client.post(path, json={"score": 3.0, "movie_id": movie['id']}, headers=headers)
+            assert response.status_code == 200
+            counts.append(response.headers["X-Query-Count"])
+    assert counts[:2] == counts[2:]
+
+    for path in ("/ratings/999999/", "/movies/999999/ratings"):
+        assert client.post(path, json={"score": 3.0, "movie_id": 999999}, headers=headers).status_code == 404
+
+
+def test_write_behind_group_commits_ratings_and_comments(client, test_user, test_movie, monkeypatch):
+    headers = {"Authorization": f"Bearer {test_user['access_token']}"}
+    movie_id = test_movie["id"]
+    writer = write_behind.WriteBehind(max_delay_ms=50)
+    monkeypatch.setattr(write_behind, "WRITE_BEHIND", True)
+    monkeypatch.setattr(write_behind, "writer", writer)
+
+    # Concurrent requests need a session each, not the shared test session.
+    def per_request_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+    monkeypatch.setitem(app.dependency_overrides, get_db, per_request_db)
+
+    async def burst():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=headers) as async_client:
+            ratings = [async_client.post(f"/ratings/{movie_id}/", json={"score": 4.0, "movie_id": movie_id}) for _ in range(6)]
+            comments = [async_client.post(f"/movies/{movie_id}/comments", json={"content": f"Queued {i}", "movie_id": movie_id}) for i in range(6)]
+            return await asyncio.gather(*ratings, *comments)
+
+    try:
+        responses = asyncio.run(burst())
+    finally:
+        writer.shutdown()
+    assert {response.status_code for response in responses} == {200}
+    assert len({(response.request.url.path, response.json()["id"]) for response in responses}) == 12
+    assert {response.json()["movie_id"] for response in responses} == {movie_id}
+
+    stats = writer.stats()
+    assert stats["rows"] == 12
+    assert stats["commits"] < 12
+    assert stats["failed"] == 0
+
+    movie = client.get(f"/movies/{movie_id}").json()
+    assert movie["rating_count"] == 6
+    assert movie["rating_avg"] == 4.0
+    assert len(movie["comments"]) == 6
+
+
+def test_write_behind_full_batch_commits_without_waiting(test_movie):
+    # By default a batch is as large as the write lane lets it get.
+    assert write_behind.WriteBehind().max_rows == lanes.LANE_WRITE_LIMIT
+    writer = write_behind.WriteBehind(max_rows=3, max_delay_ms=60_000)
+    try:
+        futures = [
+            writer.submit("comment", {"content": f"Full {i}", "movie_id": test_movie["id"], "user_id": None, "parent_comment_id": None})
+            for i in range(3)
+        ]
+        rows = [future.result(timeout=5) for future in futures]
+    finally:
+        writer.shutdown()
+    assert len({row.id for row in rows}) == 3
+    assert writer.stats()["batches"] == 1
+
+
+def test_write_behind_timeout_drops_queued_write(client, test_user, test_movie, monkeypatch):
+    headers = {"Authorization": f"Bearer {test_user['access_token']}"}
+    movie_id = test_movie["id"]
+    before = client.get(f"/movies/{movie_id}").json()["rating_count"]
+    # The batch stays open far longer than the request is willing to wait.
+    writer = write_behind.WriteBehind(max_delay_ms=300)
+    monkeypatch.setattr(write_behind, "WRITE_BEHIND", True)
+    monkeypatch.setattr(write_behind, "WRITE_BEHIND_TIMEOUT", 0.05)
+    monkeypatch.setattr(write_behind, "writer", writer)
+
+    try:
+        response = client.post(f"/ratings/{movie_id}/", json={"score": 2.0, "movie_id": movie_id}, headers=headers)
+    finally:
+        writer.shutdown()
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+    stats = writer.stats()
+    assert stats["cancelled"] == 1
+    assert stats["rows"] == 0
+    assert client.get(f"/movies/{movie_id}").json()["rating_count"] == before
+
+
+def test_write_behind_skips_leaderboard_for_missing_movie(monkeypatch):
+    board = leaderboard.Leaderboard()
+    monkeypatch.setattr(leaderboard, "board", board)
+    writer = write_behind.WriteBehind(max_delay_ms=1)
+    try:
+        writer.submit("rating", {"score": 5.0, "movie_id": 999999, "user_id": None}).result(timeout=5)
+    finally:
+        writer.shutdown()
+    assert 999999 not in board._stats
+
+
+def test_bulk_ratings(client, test_user, test_movie):
+    headers = {"Authorization": f"Bearer {test_user['access_token']}"}
+    other = client.post("/movies/", json={"title": "Bulk Movie", "description": "Imported"}, headers=headers).json()
+
+    def bulk(pairs):
+        payload = {"ratings": [{"movie_id": movie_id, "score": score} for movie_id, score in pairs]}
+        return client.post("/ratings/bulk", json=payload, headers=headers)
+
+    small = bulk([(test_movie["id"], 2.0), (other["id"], 4.0)])
+    assert small.status_code == 200
+    assert small.json()["created"] == 2
+
+    pairs = [(test_movie["id"], 2.0)] * 100 + [(other["id"], 4.0)] * 50
+    response = bulk(pairs)
+    assert response.status_code == 200
+    ids = response.json()["ids"]
+    assert len(ids) == 150 and ids == sorted(ids)
+    # Validation, insert and aggregate updates don't grow with the number of ratings.
+    assert response.headers["X-Query-Count"] == small.headers["X-Query-Count"]
+
+    movie = client.get(f"/movies/{other['id']}").json()
+    assert movie["rating_count"] == 51
+    assert movie["rating_avg"] == 4.0
+    assert len(movie["ratings"]) == 51
+    assert client.get(f"/movies/{test_movie['id']}").json()["rating_count"] == 101
+
+    missing = bulk([(other["id"], 5.0), (999999, 5.0)])
+    assert missing.status_code == 404
+    assert "999999" in missing.json()["detail"]
+    assert client.get(f"/movies/{other['id']}").json()["rating_count"] == 51
+
+    assert client.post("/ratings/bulk", json={"ratings": []}, headers=headers).status_code == 422
+    assert client.post("/ratings/bulk", json={"ratings": [{"movie_id": other["id"], "score": 1.0}]}).status_code == 401
+
+
+def test_leaderboard_rankings_stay_sorted():
+    board = leaderboard.Leaderboard(prior_weight=5, refresh_seconds=3600)
+    rng = random.Random(7)
+    for _ in range(2000):
+        movie_id = rng.randrange(200)
+        if rng.random() < 0.05:
+            board.remove(movie_id)
+        else:
+            board.record(movie_id, 1, float(rng.randint(1, 5)))
+
+    stats = dict(board._stats)
+    mean = sum(total for _, total in stats.values()) / sum(count for count, _ in stats.values())
+    scores = {
+        "avg": lambda count, total: total / count,
+        "count": lambda count, total: float(count),
+        "bayesian": lambda count, total: (5 * mean + total) / (5 + count),
+    }
+    board._bayesian_sorted_at = None  # as if the refresh interval had passed
+    for by, score in scores.items():
+        expected = sorted(stats, key=lambda movie_id: (-score(*stats[movie_id]), -stats[movie_id][0], movie_id))[:25]
+        top = board.top(by=by, limit=25)
+        assert [movie_id for movie_id, _ in top] == expected
+        assert [value for _, value in top] == pytest.approx([score(*stats[movie_id]) for movie_id in expected])
+
+
+class SlowSnapshot:
+    """Stands in for the session in Leaderboard.rebuild: a slow query for fixed rows."""
+
+    def __init__(self, rows, during=None):
+        self.rows = rows
+        self.during = during
+        self.calls = 0
+
+    def query(self, *columns):
+        return self
+
+    def filter(self, *criteria):
+        return self
+
+    def all(self):
+        self.calls += 1
+        time.sleep(0.05)
+        if self.during:
+            self.during()
+        return self.rows
+
+
+def test_leaderboard_rebuilds_once_for_concurrent_readers():
+    board = leaderboard.Leaderboard(refresh_seconds=3600)
+    snapshot = SlowSnapshot([(1, 2, 8.0)])
+    threads = [threading.Thread(target=board.refresh, args=(snapshot,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert snapshot.calls == 1
+    assert board.top(by="count") == [(1, 2.0)]
+
+
+def test_leaderboard_replays_ratings_recorded_during_rebuild():
+    board = leaderboard.Leaderboard(refresh_seconds=3600)
+    # A rating committed after the snapshot was read, recorded before it is installed.
+    snapshot = SlowSnapshot([(1, 2, 8.0)], during=lambda: board.record(1, 1, 5.0))
+    board.rebuild(snapshot)
+    assert board._stats[1] == (3, 13.0)
+    assert board.top(by="count") == [(1, 3.0)]
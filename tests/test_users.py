@@ -1,13 +1,15 @@
 # tests/test_users.py
 
+import time
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from main import app
-from app.database import Base, get_db
+from app.database import SQLALCHEMY_DATABASE_URL, Base, get_db
 from app.schema import UserCreate
 from app.auth import create_access_token
+from app import auth, crud, hashing, models
 import logging
 
 # Configure logging
@@ -15,7 +17,6 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Setup test database
-SQLALCHEMY_DATABASE_URL = "sqlite:///./app.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -96,3 +97,131 @@ def test_read_users_me(test_user):
     assert response.status_code == 200
     assert response.json()["username"] == "testuser"
 
+
+# Test case for the authenticated-user cache
+def test_current_user_is_cached():
+    token = test_login_for_access_token()
+    headers = {"Authorization": f"Bearer {token}"}
+    client.get("/users/me/", headers=headers)
+    before = client.get("/metrics").json()["auth_user_cache"]
+
+    response = client.get("/users/me/", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["username"] == "testuser"
+
+    after = client.get("/metrics").json()["auth_user_cache"]
+    assert after["hits"] == before["hits"] + 1
+    assert after["misses"] == before["misses"]
+
+
+# Test case for evicting cached identities only once the change commits
+def test_cached_user_is_evicted_on_commit_not_flush():
+    db = TestingSessionLocal()
+    try:
+        if crud.get_user_by_username(db, "evict_user") is None:
+            crud.create_user(db, UserCreate(username="evict_user", password="evictpassword", email="evict@example.com"), "")
+        user = db.query(models.User).filter(models.User.username == "evict_user").one()
+
+        auth.user_cache.set("evict_user", "cached")
+        user.email = "evict2@example.com"
+        db.flush()
+        assert auth.user_cache.get("evict_user") == "cached"
+        db.rollback()
+        assert auth.user_cache.get("evict_user") == "cached"
+
+        user.email = "evict3@example.com"
+        db.flush()
+        assert auth.user_cache.get("evict_user") == "cached"
+        db.commit()
+        assert auth.user_cache.get("evict_user") is None
+    finally:
+        db.close()
+
+
+# Test case for /users/me when the user row is gone but the identity is still cached
+def test_read_users_me_for_missing_user_returns_404():
+    client.post("/users/", json={"username": "ghost_user", "password": "ghostpassword", "email": "ghost@example.com"})
+    token = client.post("/users/token", data={"username": "ghost_user", "password": "ghostpassword"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/users/me/", headers=headers).status_code == 200
+
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM users WHERE username = 'ghost_user'"))
+    response = client.get("/users/me/", headers=headers)
+    assert response.status_code == 404
+    assert response.json()["detail"] == "User not found"
+
+
+# Test case for signing up with a taken username: rejected before any hashing
+def test_duplicate_signup_skips_hashing(test_user, monkeypatch):
+    def fail_hash(password):
+        raise AssertionError("hashed a password for a duplicate signup")
+
+    monkeypatch.setattr(hashing, "hash_password", fail_hash)
+    response = client.post("/users/", json={"username": "testuser", "password": "testpassword", "email": "testuser@example.com"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Username already registered"
+
+
+# Test case for login against a hash stored with a different bcrypt cost
+def test_login_rehashes_outdated_password():
+    db = TestingSessionLocal()
+    try:
+        user = crud.get_user_by_username(db, "rehash_user")
+        if user is None:
+            user = crud.create_user(db, UserCreate(username="rehash_user", password="rehashpassword", email="rehash@example.com"), "")
+            user = crud.get_user_by_username(db, "rehash_user")
+        weak_hash = hashing.pwd_context.handler("bcrypt").using(rounds=4).hash("rehashpassword")
+        crud.update_user_password(db, user, weak_hash)
+    finally:
+        db.close()
+
+    response = client.post("/users/token", data={"username": "rehash_user", "password": "rehashpassword"})
+    assert response.status_code == 200
+
+    db = TestingSessionLocal()
+    try:
+        stored = crud.get_user_by_username(db, "rehash_user").hashed_password
+    finally:
+        db.close()
+    assert stored != weak_hash
+    assert not hashing.pwd_context.needs_update(stored)
+
+
+# Test case for a hash that outlives HASH_TIMEOUT: 503-style error, slot held until the worker finishes
+def test_hashing_timeout_keeps_slot_until_worker_finishes(monkeypatch):
+    if hashing.HASH_WORKERS <= 0:
+        pytest.skip("hashing runs inline")
+    monkeypatch.setattr(hashing, "HASH_TIMEOUT", 0.05)
+    hashing._run(time.sleep, 0)  # start the pool outside the timed call
+    before = hashing._stats_snapshot()
+    with pytest.raises(hashing.HashingBusy):
+        hashing._run(time.sleep, 0.5)
+    assert hashing._stats_snapshot()["in_flight"] == before["in_flight"] + 1
+    assert hashing._stats_snapshot()["timed_out"] == before["timed_out"] + 1
+
+    deadline = time.monotonic() + 5
+    while hashing._stats_snapshot()["in_flight"] != before["in_flight"] and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert hashing._stats_snapshot()["in_flight"] == before["in_flight"]
+
+
+# Test case for a full hashing queue
+def test_hashing_queue_full_returns_503(monkeypatch):
+    def busy(password):
+        raise hashing.HashingBusy()
+
+    monkeypatch.setattr(hashing, "hash_password", busy)
+    response = client.post("/users/", json={"username": "busy_user", "password": "busypassword", "email": "busy@example.com"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+# Test case for execution lanes: logins are counted against the auth lane only
+def test_login_uses_auth_lane(test_user):
+    before = client.get("/metrics").json()["lanes"]
+    test_login_for_access_token()
+    after = client.get("/metrics").json()["lanes"]
+    assert after["auth"]["acquired"] == before["auth"]["acquired"] + 1
+    assert after["read"]["acquired"] == before["read"]["acquired"]
+    assert after["auth"]["limit"] > 0 and after["auth"]["in_use"] == 0